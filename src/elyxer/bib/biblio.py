@@ -29,6 +29,7 @@ from elyxer.out.output import *
 from elyxer.ref.link import *
 from elyxer.gen.layout import *
 from elyxer.proc.postprocess import *
+from elyxer.util.context import *
 
 
 class BiblioCitation(Container):
@@ -69,6 +70,8 @@ class BiblioCite(Link):
     BiblioCite.cites[key].append(self)
     return self
 
+ConversionContext.register(BiblioCite, 'cites', dict)
+
 class Bibliography(Container):
   "A bibliography layout containing an entry"
 
@@ -128,6 +131,8 @@ class BiblioReference(Link):
     BiblioReference.references[key].append(self)
     return self
 
+ConversionContext.register(BiblioReference, 'references', dict)
+
 class BiblioEntry(Container):
   "A bibliography entry"
 
@@ -156,3 +161,4 @@ class BiblioEntry(Container):
     self.contents.pop(-1)
     self.contents.append(Constant('] '))
 
+ContainerIndex.types += [BiblioEntry]
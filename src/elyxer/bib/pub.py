@@ -62,6 +62,7 @@ class PubEntry(BibEntry):
     self.index = NumberGenerator.generator.generate('pubentry')
     self.parser.tags['index'] = Constant(self.index)
     biblio = BiblioEntry()
+    ContainerIndex.current.add(biblio)
     biblio.citeref = self.createref()
     biblio.processcites(self.parser.key)
     self.contents = [biblio, Constant(' ')]
@@ -30,6 +30,7 @@ from elyxer.gen.container import *
 from elyxer.maths.formula import *
 from elyxer.maths.command import *
 from elyxer.tex.texcode import *
+from elyxer.util.context import *
 
 
 class BibTagParser(object):
@@ -246,6 +247,8 @@ class BibTag(Container):
     "Return a printable representation."
     return 'BibTag: ' + self.extracttext()
 
+ConversionContext.register(BibTag, 'stringdefs', dict)
+
 class BibAuthor(object):
   "A BibTeX individual author."
 
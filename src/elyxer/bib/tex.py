@@ -32,6 +32,7 @@ from elyxer.parse.position import *
 from elyxer.ref.link import *
 from elyxer.bib.biblio import *
 from elyxer.bib.tag import *
+from elyxer.util.buildcache import *
 
 
 class BibTeX(Container):
@@ -105,6 +106,7 @@ class BibFile(object):
   def parsefile(self):
     "Parse the whole file."
     bibpath = InputPath(self.filename)
+    Dependencies.add(bibpath.path)
     if Options.lowmem:
       pos = FilePosition(bibpath.path)
     else:
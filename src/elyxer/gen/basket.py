@@ -27,6 +27,7 @@
 from elyxer.util.options import *
 from elyxer.util.clone import *
 from elyxer.gen.toc import *
+from elyxer.gen.image import *
 
 
 class Basket(object):
@@ -40,8 +41,9 @@ class WriterBasket(Basket):
   "A writer of containers. Just writes them out to a writer."
 
   def write(self, container):
-    "Write a container to the line writer."
-    self.writer.write(container.gethtml())
+    "Write a container to the line writer, once its images are converted."
+    ImageQueue.current.complete()
+    self.writer.write(container.iterhtml())
 
   def finish(self):
     "Mark as finished."
@@ -64,7 +66,7 @@ class KeeperBasket(Basket):
   def flush(self):
     "Flush the contents to the writer."
     for container in self.contents:
-      self.writer.write(container.gethtml())
+      self.writer.write(container.iterhtml())
     self.writer.close()
 
 class TOCBasket(Basket):
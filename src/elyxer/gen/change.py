@@ -41,7 +41,7 @@ class ChangeDeleted(TaggedText):
   "A change which consists of a deletion."
 
   def __init__(self):
-    self.parser = TextParser(self)
+    TaggedText.__init__(self)
     if DocumentParameters.outputchanges:
       self.output = TaggedOutput().settag('span class="deleted"')
     else:
@@ -28,6 +28,8 @@ from elyxer.parse.parser import *
 from elyxer.out.output import *
 from elyxer.conf.config import *
 from elyxer.parse.position import *
+from elyxer.util.escape import *
+from elyxer.util.context import *
 
 
 class Container(object):
@@ -46,50 +48,31 @@ class Container(object):
 
   def gethtml(self):
     "Get the resulting HTML"
-    html = self.output.gethtml(self)
-    if isinstance(html, basestring):
-      Trace.error('Raw string ' + html)
-      html = [html]
-    return self.escapeall(html)
-
-  def escapeall(self, lines):
-    "Escape all lines in an array according to the output options."
-    result = []
-    for line in lines:
-      if Options.html:
-        line = self.escape(line, EscapeConfig.html)
-      if Options.iso885915:
-        line = self.escape(line, EscapeConfig.iso885915)
-        line = self.escapeentities(line)
-      elif not Options.unicode:
-        line = self.escape(line, EscapeConfig.nonunicode)
-      result.append(line)
-    return result
+    return list(self.iterhtml())
+
+  def iterhtml(self):
+    "Iterate over the resulting HTML, one escaped string at a time."
+    for line in self.output.iterhtml(self):
+      yield self.escapeline(line)
+
+  def escapeline(self, line):
+    "Escape a single line according to the output options."
+    if Options.html:
+      line = EscapeMaps.html.escape(line)
+    if Options.iso885915:
+      line = EscapeMaps.iso885915.escape(line)
+      line = self.escapeentities(line)
+    elif not Options.unicode:
+      line = EscapeMaps.nonunicode.escape(line)
+    return line
 
   def escape(self, line, replacements = EscapeConfig.entities):
     "Escape a line with replacements from elyxer.a map"
-    pieces = replacements.keys()
-    # do them in order
-    pieces.sort()
-    for piece in pieces:
-      if piece in line:
-        line = line.replace(piece, replacements[piece])
-    return line
+    return Escaper.get(replacements).escape(line)
 
   def escapeentities(self, line):
     "Escape all Unicode characters to HTML entities."
-    result = ''
-    pos = TextPosition(line)
-    while not pos.finished():
-      if ord(pos.current()) > 128:
-        codepoint = hex(ord(pos.current()))
-        if codepoint == '0xd835':
-          codepoint = hex(ord(pos.next()) + 0xf800)
-        result += '&#' + codepoint[1:] + ';'
-      else:
-        result += pos.current()
-      pos.skipcurrent()
-    return result
+    return EntityEscaper.instance.escape(line)
 
   def searchall(self, type):
     "Search for all embedded containers of a given type"
@@ -106,22 +89,38 @@ class Container(object):
 
   def searchprocess(self, type, process):
     "Search for elements of a given type and process them"
+    if ContainerIndex.current.isabsent(type):
+      return
     self.locateprocess(lambda container: isinstance(container, type), process)
 
   def locateprocess(self, locate, process):
-    "Search for all embedded containers and process them"
-    for container in self.contents:
-      container.locateprocess(locate, process)
-      if locate(container):
-        process(container)
+    "Search for all embedded containers and process them."
+    "The tree is walked with a stack instead of recursion;"
+    "each container is located after all of its contents."
+    stack = [(self, iter(self.contents))]
+    while len(stack) > 0:
+      for element in stack[-1][1]:
+        stack.append((element, iter(element.contents)))
+        break
+      else:
+        container = stack.pop()[0]
+        if len(stack) > 0 and locate(container):
+          process(container)
 
   def recursivesearch(self, locate, recursive, process):
-    "Perform a recursive search in the container."
-    for container in self.contents:
-      if recursive(container):
-        container.recursivesearch(locate, recursive, process)
-      if locate(container):
-        process(container)
+    "Perform a recursive search in the container, using a stack."
+    stack = [(self, iter(self.contents))]
+    while len(stack) > 0:
+      for element in stack[-1][1]:
+        if recursive(element):
+          stack.append((element, iter(element.contents)))
+          break
+        if locate(element):
+          process(element)
+      else:
+        container = stack.pop()[0]
+        if len(stack) > 0 and locate(container):
+          process(container)
 
   def extracttext(self):
     "Extract all text from elyxer.allowed containers."
@@ -142,6 +141,8 @@ class Container(object):
       group.contents.append(self.contents[index])
       self.contents.pop(index)
     self.contents.insert(index, group)
+    if ContainerIndex.isindexed(group.__class__):
+      ContainerIndex.current.add(group)
 
   def remove(self, index):
     "Remove a container but leave its contents"
@@ -189,7 +190,7 @@ class BlackBox(Container):
 
   def __init__(self):
     self.parser = LoneCommand()
-    self.output = EmptyOutput()
+    self.output = SharedOutputs.empty
     self.contents = []
 
 class LyXFormat(BlackBox):
@@ -205,13 +206,18 @@ class LyXFormat(BlackBox):
 
 class StringContainer(Container):
   "A container for a single string"
+  "There are many of them, so their usual attributes are kept in slots."
 
-  parsed = None
+  __slots__ = ('contents', 'output', 'parser', 'parent', 'begin', 'start',
+      'header', 'parameters', 'parsed', 'string')
 
   def __init__(self):
     self.parser = StringParser()
-    self.output = StringOutput()
+    self.output = SharedOutputs.string
     self.string = ''
+    self.parent = None
+    self.begin = None
+    self.parsed = None
 
   def process(self):
     "Replace special chars from elyxer.the contents."
@@ -221,7 +227,7 @@ class StringContainer(Container):
 
   def replacespecial(self, line):
     "Replace all special chars from elyxer.a line"
-    replaced = self.escape(line, EscapeConfig.entities)
+    replaced = EscapeMaps.entities.escape(line)
     replaced = self.changeline(replaced)
     if ContainerConfig.string['startcommand'] in replaced and len(replaced) > 1:
       # unprocessed commands
@@ -233,10 +239,10 @@ class StringContainer(Container):
     return replaced
 
   def changeline(self, line):
-    line = self.escape(line, EscapeConfig.chars)
+    line = EscapeMaps.chars.escape(line)
     if not ContainerConfig.string['startcommand'] in line:
       return line
-    line = self.escape(line, EscapeConfig.commands)
+    line = EscapeMaps.commands.escape(line)
     return line
 
   def extracttext(self):
@@ -256,10 +262,15 @@ class StringContainer(Container):
 class Constant(StringContainer):
   "A constant string"
 
+  __slots__ = ()
+
   def __init__(self, text):
     self.contents = []
     self.string = text
-    self.output = StringOutput()
+    self.output = SharedOutputs.string
+    self.parent = None
+    self.begin = None
+    self.parsed = None
 
   def __unicode__(self):
     return 'Constant: ' + self.string
@@ -267,11 +278,13 @@ class Constant(StringContainer):
 class TaggedText(Container):
   "Text inside a tag"
 
-  output = None
+  __slots__ = ('contents', 'output', 'parser', 'parent', 'begin')
 
   def __init__(self):
     self.parser = TextParser(self)
     self.output = TaggedOutput()
+    self.parent = None
+    self.begin = None
 
   def complete(self, contents, tag, breaklines=False):
     "Complete the tagged text and return it"
@@ -293,3 +306,57 @@ class TaggedText(Container):
       return 'Tagged <unknown tag>'
     return 'Tagged <' + self.output.tag + '>'
 
+class ContainerIndex(object):
+  "An index of the containers of some types in the current document."
+  "Indexed types are counted as they are parsed; code that creates them"
+  "otherwise must add() them. A search for an indexed type of which no"
+  "container has been counted can then return at once, without a walk."
+
+  types = []
+  current = None
+
+  def isindexed(cls, type):
+    "Check if all containers of a type are counted."
+    for indexed in cls.types:
+      if issubclass(type, indexed):
+        return True
+    return False
+
+  isindexed = classmethod(isindexed)
+
+  def __init__(self):
+    self.counts = dict()
+    self.absent = dict()
+
+  def add(self, container):
+    "Count a container of an indexed type."
+    type = container.__class__
+    if not type in self.counts:
+      self.counts[type] = 0
+      self.absent = dict()
+    self.counts[type] += 1
+
+  def isabsent(self, type):
+    "Check if the document cannot contain any container of a given type."
+    "Counts are never decreased, so removing containers keeps it correct."
+    if not type in self.absent:
+      self.absent[type] = self.computeabsent(type)
+    return self.absent[type]
+
+  def computeabsent(self, type):
+    "Check the counted types to know if a type is absent."
+    if not ContainerIndex.isindexed(type):
+      return False
+    for counted in self.counts:
+      if issubclass(counted, type):
+        return False
+    return True
+
+  def __unicode__(self):
+    "Return a printable representation."
+    counts = [type.__name__ + ': ' + unicode(self.counts[type]) for type in self.counts]
+    return 'Container index with ' + ', '.join(sorted(counts))
+
+ContainerIndex.current = ContainerIndex()
+
+ConversionContext.register(ContainerIndex, 'current', ContainerIndex)
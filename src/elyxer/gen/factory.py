@@ -60,24 +60,28 @@ class ContainerFactory(object):
     types = dict()
     for start, typename in ContainerConfig.starts.iteritems():
       types[start] = globals()[typename]
-    self.tree = ParseTree(types)
+    self.table = StartTable(types)
 
   def createcontainer(self, reader):
     "Parse a single container."
     #Trace.debug('processing "' + reader.currentline().strip() + '"')
-    if reader.currentline() == '':
+    line = reader.currentline()
+    if line == '':
       reader.nextline()
       return None
-    container = Cloner.create(self.tree.find(reader))
-    container.start = reader.currentline().strip()
-    self.parse(container, reader)
+    entry = self.table.find(line)
+    container = Cloner.create(entry.type)
+    container.start = line.strip()
+    self.parse(container, reader, entry.ending)
+    if entry.indexed:
+      ContainerIndex.current.add(container)
     return container
 
-  def parse(self, container, reader):
+  def parse(self, container, reader, ending):
     "Parse a container"
     parser = container.parser
     parser.parent = container
-    parser.ending = self.getending(container)
+    parser.ending = ending
     parser.factory = self
     container.header = parser.parseheader(reader)
     container.begin = parser.begin
@@ -95,61 +99,95 @@ class ContainerFactory(object):
     else:
       container.contents = contents
 
-  def getending(self, container):
-    "Get the ending for a container"
-    split = container.start.split()
-    if len(split) == 0:
-      return None
-    start = split[0]
-    if start in ContainerConfig.startendings:
-      return ContainerConfig.startendings[start]
-    classname = container.__class__.__name__
-    if classname in ContainerConfig.endings:
-      return ContainerConfig.endings[classname]
-    if hasattr(container, 'ending'):
-      Trace.error('Pending ending in ' + container.__class__.__name__)
-      return container.ending
-    return None
-
-class ParseTree(object):
-  "A parsing tree"
-
-  default = '~~default~~'
+class StartEntry(object):
+  "The type of container for a start, along with its ending."
+
+  def __init__(self, type, first):
+    "Set the type and resolve the ending from the first piece of the start."
+    self.type = type
+    self.indexed = ContainerIndex.isindexed(type)
+    self.ending = None
+    if first in ContainerConfig.startendings:
+      self.ending = ContainerConfig.startendings[first]
+    elif type.__name__ in ContainerConfig.endings:
+      self.ending = ContainerConfig.endings[type.__name__]
+    elif hasattr(type, 'ending'):
+      Trace.error('Pending ending in ' + type.__name__)
+      self.ending = type.ending
+
+class StartTable(object):
+  "A table to find the container that starts on a line."
+  "Starts are grouped by their first piece; each group maps the pieces of"
+  "its starts to entries, and keeps their lengths from longest to shortest."
+  "A line is split only once, and matched against the longest start possible."
 
   def __init__(self, types):
-    "Create the parse tree"
-    self.root = dict()
+    "Create the table from a map of starts to types."
+    self.default = None
+    self.groups = dict()
+    self.generic = dict()
     for start, type in types.iteritems():
       self.addstart(type, start)
 
   def addstart(self, type, start):
-    "Add a start piece to the tree"
-    tree = self.root
-    for piece in start.split():
-      if not piece in tree:
-        tree[piece] = dict()
-      tree = tree[piece]
-    if ParseTree.default in tree:
-      Trace.error('Start ' + start + ' duplicated')
-    tree[ParseTree.default] = type
-
-  def find(self, reader):
-    "Find the current sentence in the tree"
-    branches = self.matchline(reader.currentline())
-    while not ParseTree.default in branches[-1]:
-      branches.pop()
-    last = branches[-1]
-    return last[ParseTree.default]
-
-  def matchline(self, line):
-    "Match a given line against the tree, as deep as possible."
-    branches = [self.root]
-    for piece in line.split(' '):
-      current = branches[-1]
-      piece = piece.rstrip('>')
-      if piece in current:
-        branches.append(current[piece])
+    "Add a start to the table."
+    pieces = tuple(start.split())
+    if len(pieces) == 0:
+      self.default = type
+      return
+    if not pieces[0] in self.groups:
+      self.groups[pieces[0]] = StartGroup()
+    self.groups[pieces[0]].add(pieces, StartEntry(type, pieces[0]))
+
+  def find(self, line):
+    "Find the entry for the start of a line."
+    pieces = line.split(' ')
+    first = pieces[0].rstrip('>')
+    if not first in self.groups:
+      return self.resolve(self.default, line)
+    entry = self.groups[first].find(first, pieces)
+    if not entry:
+      return self.resolve(self.default, line)
+    if first != pieces[0]:
+      return self.resolve(entry.type, line)
+    return entry
+
+  def resolve(self, type, line):
+    "Get the entry for a type when the ending cannot be known from the start:"
+    "it depends on the first word in the line."
+    split = line.split(None, 1)
+    if len(split) > 0 and split[0] in ContainerConfig.startendings:
+      return StartEntry(type, split[0])
+    if not type in self.generic:
+      self.generic[type] = StartEntry(type, None)
+    return self.generic[type]
+
+class StartGroup(object):
+  "A group of starts that share the first piece."
+
+  def __init__(self):
+    self.entries = dict()
+    self.lengths = []
+
+  def add(self, pieces, entry):
+    "Add the entry for a start, given as a tuple of pieces."
+    if pieces in self.entries:
+      Trace.error('Start ' + ' '.join(pieces) + ' duplicated')
+    self.entries[pieces] = entry
+    if not len(pieces) in self.lengths:
+      self.lengths.append(len(pieces))
+      self.lengths.sort(reverse = True)
+
+  def find(self, first, pieces):
+    "Find the entry for the longest start in the given pieces."
+    for length in self.lengths:
+      if length == 1:
+        key = (first,)
+      elif length <= len(pieces):
+        key = (first,) + tuple([piece.rstrip('>') for piece in pieces[1:length]])
       else:
-        return branches
-    return branches
+        continue
+      if key in self.entries:
+        return self.entries[key]
+    return None
 
@@ -31,6 +31,7 @@ from elyxer.gen.image import *
 from elyxer.ref.label import *
 from elyxer.ref.partkey import *
 from elyxer.proc.postprocess import *
+from elyxer.util.context import *
 
 
 class Float(Container):
@@ -68,7 +69,8 @@ class Float(Container):
   def processtags(self):
     "Process the HTML tags."
     tagged = self.embed()
-    self.applywideningtag(tagged)
+    # the widening depends on the size of the converted image
+    ImageQueue.current.then(lambda: self.applywideningtag(tagged))
 
   def embed(self):
     "Embed the whole contents in a div."
@@ -130,6 +132,8 @@ class Float(Container):
     "Return a printable representation"
     return 'Floating inset of type ' + self.type
 
+ContainerIndex.types += [Float]
+
 class Wrap(Float):
   "A wrapped (floating) float"
 
@@ -232,6 +236,8 @@ class Listing(Container):
       contents.insert(0, TaggedText().constant(unicode(self.counter), tag))
     return contents
 
+ConversionContext.registerinitial(Listing, 'processor')
+
 class FloatNumber(Container):
   "Holds the number for a float in the caption."
 
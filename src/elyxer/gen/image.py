@@ -31,6 +31,8 @@ from elyxer.util.translate import *
 from elyxer.gen.container import *
 from elyxer.gen.size import *
 from elyxer.io.path import *
+from elyxer.util.context import *
+from elyxer.util.buildcache import *
 
 
 class Image(Container):
@@ -50,10 +52,15 @@ class Image(Container):
     self.origin = InputPath(self.getparameter('filename'))
     self.destination = self.getdestination(self.origin)
     self.size = ContainerSize().readparameters(self)
+    Dependencies.add(self.origin.path)
     if self.origin.exists():
       ImageConverter.instance.convert(self)
     else:
       Trace.error('Image ' + unicode(self.origin) + ' not found')
+    ImageQueue.current.then(self.complete)
+
+  def complete(self):
+    "Set the size and the tag, once the image has been converted."
     self.setsize()
     self.settag()
 
@@ -113,6 +120,8 @@ class ImageConverter(object):
   cropboxformats = ImageConfig.cropboxformats
 
   active = True
+  # conversions are only queued once the converter is known to work
+  working = False
   instance = None
 
   def convert(self, image):
@@ -124,25 +133,41 @@ class ImageConverter(object):
     if image.destination.exists():
       if image.origin.getmtime() <= image.destination.getmtime():
         # file has not changed; do not convert
+        Dependencies.addoutput(image.destination.path)
         return
+    if ImageQueue.current.isqueued(image.destination):
+      # already being converted for another image
+      return
     image.destination.createdirs()
     if Options.copyimages:
       Trace.debug('Copying ' + image.origin.path + ' to ' + image.destination.path)
       shutil.copy2(image.origin.path, image.destination.path)
+      Dependencies.addoutput(image.destination.path)
       return
     converter, command = self.buildcommand(image)
-    try:
-      Trace.debug(converter + ' command: "' + command + '"')
-      result = os.system(command.encode(sys.getfilesystemencoding()))
-      if result != 0:
-        Trace.error(converter + ' not installed; images will not be processed')
-        ImageConverter.active = False
-        return
-      Trace.message('Converted ' + unicode(image.origin) + ' to ' +
-          unicode(image.destination))
-    except OSError, exception:
+    Trace.debug(converter + ' command: "' + command + '"')
+    command = command.encode(sys.getfilesystemencoding())
+    if Options.imagejobs and ImageConverter.working:
+      ImageQueue.current.add(image, converter, command)
+      return
+    self.report(image, converter, runcommand(command))
+
+  def report(self, image, converter, outcome):
+    "Report the outcome of a conversion: the result and any exception."
+    result, exception = outcome
+    if exception:
       Trace.error('Error while converting image ' + unicode(image.origin)
           + ': ' + unicode(exception))
+      return
+    if result != 0:
+      if ImageConverter.active:
+        Trace.error(converter + ' not installed; images will not be processed')
+      ImageConverter.active = False
+      return
+    ImageConverter.working = True
+    Dependencies.addoutput(image.destination.path)
+    Trace.message('Converted ' + unicode(image.origin) + ' to ' +
+        unicode(image.destination))
 
   def buildcommand(self, image):
     "Build the command to convert the image."
@@ -188,6 +213,85 @@ class ImageConverter(object):
 
 ImageConverter.instance = ImageConverter()
 
+def runcommand(command):
+  "Run a conversion command, possibly in a worker thread."
+  "Return the result and any exception raised."
+  try:
+    return (os.system(command), None)
+  except OSError, exception:
+    return (None, exception)
+
+class ImageQueue(object):
+  "A queue of images converted in the background by a pool of threads."
+  "Each destination is converted only once. Anything that depends on"
+  "converted images (their dimensions, the tags that use them) is deferred"
+  "until all queued conversions finish, and then done in the same order."
+  "Images are only queued after one conversion has succeeded in the"
+  "foreground, so that a missing converter is not launched for every image."
+
+  current = None
+
+  def __init__(self):
+    self.pool = None
+    self.jobs = []
+    self.destinations = set()
+    self.actions = []
+
+  def add(self, image, converter, command):
+    "Queue the conversion of an image."
+    if not self.pool:
+      import multiprocessing.pool
+      self.pool = multiprocessing.pool.ThreadPool(Options.imagejobs)
+    self.destinations.add(image.destination.path)
+    result = self.pool.apply_async(runcommand, (command,))
+    self.jobs.append((self.getprefix(), image, converter, result))
+
+  def isqueued(self, destination):
+    "Find out if an image is being converted to the given destination."
+    return destination.path in self.destinations
+
+  def then(self, action):
+    "Run an action once all queued conversions finish: now if there are none."
+    if len(self.jobs) == 0:
+      action()
+      return
+    self.actions.append((self.getprefix(), action))
+
+  def getprefix(self):
+    "Get the current prefix for trace messages, to show it again later."
+    if not Trace.prefix:
+      return None
+    return unicode(Trace.prefix)
+
+  def complete(self):
+    "Wait for all queued conversions, report on them and run deferred actions."
+    if len(self.jobs) == 0:
+      return
+    original = Trace.prefix
+    for prefix, image, converter, result in self.jobs:
+      Trace.prefix = prefix
+      ImageConverter.instance.report(image, converter, result.get())
+    self.jobs = []
+    self.destinations = set()
+    actions = self.actions
+    self.actions = []
+    for prefix, action in actions:
+      Trace.prefix = prefix
+      action()
+    Trace.prefix = original
+
+  def finish(self):
+    "Complete all conversions and stop the pool."
+    self.complete()
+    if self.pool:
+      self.pool.close()
+      self.pool.join()
+      self.pool = None
+
+ImageQueue.current = ImageQueue()
+
+ConversionContext.register(ImageQueue, 'current', ImageQueue)
+
 class ImageFile(object):
   "A file corresponding to an image (JPG or PNG)"
 
@@ -275,3 +379,5 @@ class ImageFile(object):
     "Seek forward, just by reading the given number of bytes"
     file.read(bytes)
 
+ConversionContext.register(ImageFile, 'dimensions', dict)
+
@@ -31,6 +31,7 @@ from elyxer.gen.container import *
 from elyxer.gen.styles import *
 from elyxer.gen.layout import *
 from elyxer.gen.float import *
+from elyxer.util.buildcache import *
 
 
 class IncludeInset(Container):
@@ -48,6 +49,7 @@ class IncludeInset(Container):
     "Include the provided child document"
     self.filename = os.path.join(Options.directory, self.getparameter('filename'))
     Trace.debug('Child document: ' + self.filename)
+    Dependencies.add(self.filename)
     LstParser().parsecontainer(self)
     command = self.getparameter('LatexCommand')
     if command == 'verbatiminput':
@@ -109,3 +111,4 @@ class IncludeInset(Container):
       return 'Included unnamed file'
     return 'Included "' + self.filename + '"'
 
+ContainerIndex.types += [IncludeInset]
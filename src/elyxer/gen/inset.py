@@ -97,6 +97,8 @@ class ShortTitle(Container):
     self.parser = InsetParser()
     self.output = EmptyOutput()
 
+ContainerIndex.types += [ShortTitle]
+
 class FlexInset(Container):
   "A flexible inset, generic version."
 
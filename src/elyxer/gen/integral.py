@@ -28,6 +28,7 @@ from elyxer.gen.float import *
 from elyxer.ref.index import *
 from elyxer.bib.biblio import *
 from elyxer.gen.basket import *
+from elyxer.util.context import *
 
 
 class IntegralProcessor(object):
@@ -98,6 +99,8 @@ class IntegralFloat(IntegralProcessor):
       IntegralFloat.bytype[float.type] = []
     IntegralFloat.bytype[float.type].append(float)
 
+ConversionContext.register(IntegralFloat, 'bytype', dict)
+
 class IntegralListOf(IntegralProcessor):
   "A processor for an integral list of floats."
 
@@ -153,6 +156,11 @@ class MemoryBasket(KeeperBasket):
 
   def searchintegral(self):
     "Search for all containers for all integral processors."
+    "Processors for types absent from the document are left out of the search."
+    self.searched = [processor for processor in self.processors
+        if not ContainerIndex.current.isabsent(processor.processedtype)]
+    if len(self.searched) == 0:
+      return
     for container in self.contents:
       # container.tree()
       if self.integrallocate(container):
@@ -161,14 +169,14 @@ class MemoryBasket(KeeperBasket):
 
   def integrallocate(self, container):
     "Locate all integrals."
-    for processor in self.processors:
+    for processor in self.searched:
       if processor.locate(container):
         return True
     return False
 
   def integralstore(self, container):
     "Store a container in one or more processors."
-    for processor in self.processors:
+    for processor in self.searched:
       if processor.locate(container):
         processor.store(container)
 
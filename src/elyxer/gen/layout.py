@@ -32,6 +32,7 @@ from elyxer.proc.postprocess import *
 from elyxer.ref.label import *
 from elyxer.ref.partkey import *
 from elyxer.ref.link import *
+from elyxer.util.context import *
 
 
 class Layout(Container):
@@ -120,6 +121,8 @@ class Abstract(Layout):
     self.contents.insert(0, tagged)
     Abstract.done = True
 
+ConversionContext.registerinitial(Abstract, 'done')
+
 class FirstWorder(Layout):
   "A layout where the first word is extracted"
 
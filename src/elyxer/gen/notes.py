@@ -28,6 +28,7 @@ from elyxer.parse.parser import *
 from elyxer.out.output import *
 from elyxer.gen.container import *
 from elyxer.ref.link import *
+from elyxer.util.context import *
 
 
 class SideNote(Container):
@@ -136,6 +137,8 @@ class EndFootnotes(Container):
     header = TaggedText().constant(Translator.translate('footnotes'), 'h1 class="index"')
     self.contents = [header] + self.footnotes
 
+ConversionContext.register(EndFootnotes, 'footnotes', list)
+
 class Note(Container):
   "A LyX note of several types"
 
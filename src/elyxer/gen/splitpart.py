@@ -27,6 +27,8 @@
 from elyxer.util.translate import *
 from elyxer.gen.basket import *
 from elyxer.gen.integral import *
+from elyxer.util.context import *
+from elyxer.util.buildcache import *
 
 
 class SplitPartLink(IntegralProcessor):
@@ -209,6 +211,7 @@ class SplitFileBasket(MemoryBasket):
       return
     text = Translator.translate('toc-for') + self.root.partkey.tocentry
     toc = TableOfContents().create(text)
+    ContainerIndex.current.add(toc)
     self.addbranches(self.root, toc)
     toc.add(self.converter.convertindented(LyXFooter()))
     self.write(toc)
@@ -278,6 +281,7 @@ class SplitPartBasket(Basket):
     "Add a new basket."
     if not writer:
       writer = LineWriter(filename)
+      Dependencies.addoutput(filename)
     basket = SplitFileBasket()
     basket.setwriter(writer)
     self.baskets.append(basket)
@@ -305,6 +309,8 @@ class SplitPartBasket(Basket):
     base, extension = os.path.splitext(basename)
     return base + '-' + partname + extension
 
+ConversionContext.register(SplitPartBasket, 'baskets', list)
+
 class SplitTOCBasket(SplitPartBasket):
   "A basket which contains the TOC for a split part document."
 
@@ -23,8 +23,8 @@
 # Bulk file processing
 
 import os
-import codecs
 from elyxer.io.fileline import *
+from elyxer.io.mapped import *
 from elyxer.util.trace import Trace
 
 
@@ -49,12 +49,14 @@ class BulkFile(object):
 
   def readcodec(self, encoding):
     "Read the whole file with the given encoding"
-    filein = codecs.open(self.filename, 'rU', encoding)
-    lines = filein.readlines()
+    mapped = MappedFile(self.filename)
     result = []
-    for line in lines:
-      result.append(line.strip('\r\n') + '\n')
-    filein.close()
+    try:
+      for line in mapped.readlines(encoding):
+        for part in line.splitlines(True):
+          result.append(part.strip('\r\n') + '\n')
+    finally:
+      mapped.close()
     return result
 
   def getfiles(self):
@@ -25,33 +25,36 @@
 import sys
 import codecs
 from elyxer.util.trace import Trace
+from elyxer.io.mapped import *
 
 
 class LineReader(object):
   "Reads a file line by line"
+  "A file given by name is mapped in memory and each line decoded when read;"
+  "an open file (like stdin) is read one line at a time."
 
   def __init__(self, filename):
-    if isinstance(filename, file):
-      self.file = filename
-    else:
-      self.file = codecs.open(filename, 'rU', 'utf-8')
+    self.file = None
+    self.mapped = None
+    self.index = 0
     self.linenumber = 1
     self.lastline = None
     self.current = None
     self.mustread = True
     self.depleted = False
-    try:
-      self.readline()
-    except UnicodeDecodeError:
-      # try compressed file
-      import gzip
-      self.file = gzip.open(filename, 'rb')
-      self.readline()
+    if isinstance(filename, file):
+      self.file = filename
+    else:
+      self.mapped = MappedFile(filename)
+    self.readline()
 
   def setstart(self, firstline):
     "Set the first line to read."
-    for i in range(firstline):
-      self.file.readline()
+    if self.file:
+      for i in range(firstline):
+        self.file.readline()
+    else:
+      self.index += firstline
     self.linenumber = firstline
 
   def setend(self, lastline):
@@ -71,16 +74,22 @@ class LineReader(object):
     self.mustread = True
 
   def readline(self):
-    "Read a line from elyxer.file"
-    self.current = self.file.readline()
-    if not isinstance(self.file, codecs.StreamReaderWriter):
-      self.current = self.current.decode('utf-8')
-    if len(self.current) == 0:
+    "Read a line from the file"
+    if self.file:
+      self.current = self.file.readline().decode('utf-8')
+      if len(self.current) == 0:
+        self.depleted = True
+      self.current = self.current.rstrip('\n\r')
+    elif self.index < len(self.mapped):
+      self.current = self.mapped.getline(self.index).rstrip('\r')
+      self.index += 1
+    else:
+      self.current = u''
       self.depleted = True
-    self.current = self.current.rstrip('\n\r')
+      self.mapped.close()
     self.linenumber += 1
     self.mustread = False
-    Trace.prefix = 'Line ' + unicode(self.linenumber) + ': '
+    Trace.prefix = self
     if self.linenumber % 1000 == 0:
       Trace.message('Parsing')
 
@@ -93,12 +102,21 @@ class LineReader(object):
     return self.depleted
 
   def close(self):
-    self.file.close()
+    "Close the file."
+    if self.file:
+      self.file.close()
+    else:
+      self.mapped.close()
+
+  def __unicode__(self):
+    "Return the prefix for trace messages: the current line number."
+    return 'Line ' + unicode(self.linenumber) + ': '
 
 class LineWriter(object):
   "Writes a file as a series of lists"
 
   file = False
+  buffersize = 1000
 
   def __init__(self, filename):
     if isinstance(filename, file):
@@ -108,12 +126,18 @@ class LineWriter(object):
       self.filename = filename
 
   def write(self, strings):
-    "Write a list of strings"
+    "Write a list or an iterator of strings, joining them in chunks."
+    buffer = []
     for string in strings:
       if not isinstance(string, basestring):
         Trace.error('Not a string: ' + unicode(string) + ' in ' + unicode(strings))
-        return
-      self.writestring(string)
+        break
+      buffer.append(string)
+      if len(buffer) == LineWriter.buffersize:
+        self.writestring(''.join(buffer))
+        buffer = []
+    if len(buffer) > 0:
+      self.writestring(''.join(buffer))
 
   def writestring(self, string):
     "Write a string"
@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer files mapped in memory, read line by line.
+
+
+import os
+import re
+import mmap
+import array
+
+
+class MappedFile(object):
+  "A file mapped in memory, with an index of the lines in it."
+  "Lines are decoded in blocks only when requested, so that the contents of a"
+  "big file are never held in Python strings as a whole. Compressed files"
+  "cannot be mapped and are uncompressed in memory instead."
+
+  linebreak = re.compile('\n')
+  gzipmagic = '\x1f\x8b'
+  blocksize = 1000
+
+  def __init__(self, filename):
+    "Map the file and index its lines."
+    self.file = open(filename, 'rb')
+    self.buffer = ''
+    if os.fstat(self.file.fileno()).st_size > 0:
+      self.buffer = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+    if self.buffer[:len(self.gzipmagic)] == self.gzipmagic:
+      self.close()
+      import gzip
+      self.file = gzip.open(filename, 'rb')
+      self.buffer = self.file.read()
+    self.ends = array.array('l', (match.end() for match in self.linebreak.finditer(self.buffer)))
+    if len(self.buffer) > 0 and (len(self.ends) == 0 or self.ends[-1] != len(self.buffer)):
+      # last line without a line break
+      self.ends.append(len(self.buffer))
+    self.block = None
+    self.lines = None
+
+  def __len__(self):
+    "Return the number of lines in the file."
+    return len(self.ends)
+
+  def getline(self, index, encoding = 'utf-8'):
+    "Get the line at the given index, without the line break."
+    block = (index / self.blocksize, encoding)
+    if block != self.block:
+      self.lines = self.decodeblock(index / self.blocksize, encoding)
+      self.block = block
+    return self.lines[index % self.blocksize]
+
+  def decodeblock(self, block, encoding):
+    "Decode the lines in a block."
+    first = block * self.blocksize
+    last = min(first + self.blocksize, len(self.ends))
+    start = 0
+    if first > 0:
+      start = self.ends[first - 1]
+    return self.buffer[start:self.ends[last - 1]].decode(encoding).split(u'\n')
+
+  def readlines(self, encoding = 'utf-8'):
+    "Decode all lines in the file with their line breaks, one block at a time."
+    for index in range(len(self.ends) - 1):
+      yield self.getline(index, encoding) + u'\n'
+    if len(self.ends) > 0:
+      last = self.getline(len(self.ends) - 1, encoding)
+      if self.buffer[-1:] == '\n':
+        last += u'\n'
+      yield last
+
+  def close(self):
+    "Release the mapping and close the file."
+    if isinstance(self.buffer, mmap.mmap):
+      self.buffer.close()
+    self.buffer = ''
+    self.block = None
+    self.lines = None
+    self.file.close()
+
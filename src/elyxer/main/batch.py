@@ -0,0 +1,181 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer batch conversion of many documents with a pool of processes.
+
+import os
+import time
+from elyxer.util.trace import Trace
+from elyxer.util.options import *
+from elyxer.io.bulk import *
+
+
+class BatchJob(object):
+  "A single document to convert as part of a batch."
+
+  # the document converter will be set in convert.py
+  converter = None
+
+  def __init__(self, filein, fileout):
+    "Set the input and output filenames."
+    self.filein = filein
+    self.fileout = fileout
+    self.error = None
+    self.elapsed = 0
+
+  def convert(self):
+    "Convert the document, recording any error instead of raising it."
+    start = time.time()
+    try:
+      BatchJob.converter.convert(self.filein, self.fileout)
+    except (Exception, SystemExit), exception:
+      self.error = exception.__class__.__name__ + ': ' + unicode(exception)
+    # messages after the conversion do not refer to any line in the document
+    Trace.prefix = None
+    self.elapsed = time.time() - start
+    return self
+
+  def __unicode__(self):
+    "Return a printable representation."
+    return 'Batch job ' + self.filein + ' -> ' + self.fileout
+
+def convertjob(job):
+  "Convert a batch job inside a worker process."
+  return job.convert()
+
+class BatchReader(object):
+  "Read the list of jobs from a directory or from a manifest file."
+  "A manifest contains one document per line: the input filename, and"
+  "optionally a tab and the output filename. Lines starting with # are ignored."
+  "Relative filenames in a manifest are relative to the manifest itself."
+
+  extension = '.lyx'
+  output = '.html'
+  comment = '#'
+
+  def __init__(self, source, destination = None):
+    "Set the source (directory or manifest) and the destination directory."
+    self.source = source
+    self.destination = destination
+
+  def readjobs(self):
+    "Read all jobs from the source."
+    if os.path.isdir(self.source):
+      return self.walkdirectory()
+    return self.readmanifest()
+
+  def walkdirectory(self):
+    "Walk a directory looking for LyX files."
+    jobs = []
+    prefix = os.path.join(self.source, '')
+    for dirpath, dirnames, filenames in os.walk(self.source):
+      dirnames.sort()
+      for filename in sorted(filenames):
+        if filename.endswith(self.extension):
+          filein = os.path.join(dirpath, filename)
+          relative = filein[len(prefix):]
+          jobs.append(BatchJob(filein, self.getoutput(relative, self.source)))
+    return jobs
+
+  def readmanifest(self):
+    "Read the jobs listed in a manifest file."
+    jobs = []
+    base = os.path.dirname(self.source)
+    for line in BulkFile(self.source).readall():
+      line = line.rstrip('\r\n')
+      if line.strip() == '' or line.startswith(self.comment):
+        continue
+      split = line.split('\t')
+      filein = os.path.join(base, split[0].strip())
+      if len(split) > 1 and split[1].strip() != '':
+        fileout = os.path.join(base, split[1].strip())
+      else:
+        fileout = self.getoutput(split[0].strip(), base)
+      jobs.append(BatchJob(filein, fileout))
+    return jobs
+
+  def getoutput(self, relative, base):
+    "Get the output filename for a relative input filename."
+    name = os.path.splitext(relative)[0] + self.output
+    if self.destination:
+      return os.path.join(self.destination, name)
+    return os.path.join(base, name)
+
+class BatchConverter(object):
+  "Convert many documents using a pool of worker processes."
+  "The converter is prepared in the parent process so that every forked"
+  "worker inherits it already built; each document gets a fresh context."
+
+  def __init__(self):
+    self.converted = 0
+    self.failed = 0
+
+  def parse(self, args):
+    "Parse the source and optional destination from the command line."
+    if len(args) == 0 or len(args) > 2:
+      Trace.error('Usage: elyxer.py --batch [options] directory|manifest [destdir]')
+      return None
+    destination = None
+    if len(args) == 2:
+      destination = args[1]
+    return BatchReader(args[0], destination).readjobs()
+
+  def convertall(self, jobs):
+    "Convert all jobs in the pool and report on each one."
+    BatchJob.converter.prepare()
+    for job in jobs:
+      self.createdirs(job.fileout)
+    if Options.jobs == 1:
+      for job in jobs:
+        self.report(job.convert())
+    else:
+      self.convertpool(jobs)
+    Trace.message(unicode(self.converted) + ' documents converted, ' +
+        unicode(self.failed) + ' failed')
+    return self.failed == 0
+
+  def convertpool(self, jobs):
+    "Convert all jobs in a pool of processes."
+    import multiprocessing
+    pool = multiprocessing.Pool(Options.jobs)
+    try:
+      for job in pool.imap_unordered(convertjob, jobs):
+        self.report(job)
+    finally:
+      pool.close()
+      pool.join()
+
+  def createdirs(self, filename):
+    "Create the directories for an output file, if needed."
+    dirname = os.path.dirname(filename)
+    if dirname != '' and not os.path.isdir(dirname):
+      os.makedirs(dirname)
+
+  def report(self, job):
+    "Report on a finished job."
+    if job.error:
+      self.failed += 1
+      Trace.error('Failed ' + job.filein + ': ' + job.error)
+      return
+    self.converted += 1
+    Trace.message('Converted ' + job.filein + ' to ' + job.fileout +
+        ' in ' + '%.2f' % job.elapsed + ' s')
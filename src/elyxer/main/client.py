@@ -0,0 +1,104 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer thin client for the conversion server.
+
+
+import os
+import sys
+import socket
+from elyxer.util.trace import Trace
+
+
+class ConversionClient(object):
+  "Send conversion requests to an eLyXer server through a Unix socket."
+  "A request is a JSON object with the command line arguments and the"
+  "working directory; the reply contains the status and the messages."
+
+  buffersize = 65536
+
+  def __init__(self, path):
+    "Set the path to the server socket."
+    self.path = path
+
+  def convert(self, args):
+    "Ask the server to convert with the given command line arguments."
+    "Show the messages from the server and return the resulting status."
+    request = dict()
+    request['directory'] = os.getcwd()
+    request['args'] = [arg.decode('utf-8') for arg in args]
+    try:
+      reply = self.send(request)
+    except socket.error, exception:
+      Trace.error('Cannot reach server at ' + self.path + ': ' + unicode(exception))
+      return 1
+    except ValueError, exception:
+      Trace.error('Invalid reply from server at ' + self.path + ': ' + unicode(exception))
+      return 1
+    sys.stdout.write(reply['output'].encode('utf-8'))
+    sys.stderr.write(reply['errors'].encode('utf-8'))
+    return reply['status']
+
+  def send(self, request):
+    "Send a request and wait for the reply."
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      connection.connect(self.path)
+      ConversionMessage(connection).send(request)
+      return ConversionMessage(connection).receive()
+    finally:
+      connection.close()
+
+class ConversionMessage(object):
+  "A JSON message sent through a socket."
+  "The sender shuts down its side of the socket to mark the end of the message."
+
+  def __init__(self, connection):
+    self.connection = connection
+
+  def send(self, message):
+    "Send a message and shut down writing."
+    import json
+    self.connection.sendall(json.dumps(message))
+    self.connection.shutdown(socket.SHUT_WR)
+
+  def receive(self):
+    "Receive a whole message until the other side stops writing."
+    import json
+    chunks = []
+    while True:
+      chunk = self.connection.recv(ConversionClient.buffersize)
+      if not chunk:
+        break
+      chunks.append(chunk)
+    return json.loads(''.join(chunks))
+
+def main():
+  "Main function, called if invoked from the command line"
+  args = list(sys.argv)
+  if len(args) < 2:
+    Trace.error('Usage: elyxer-client.py socket [options] filein fileout')
+    Trace.error('Convert a LyX file using an eLyXer server started with:')
+    Trace.error('  elyxer.py --serve socket')
+    exit(1)
+  exit(ConversionClient(args[1]).convert(args[2:]))
+
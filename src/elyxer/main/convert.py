@@ -27,6 +27,7 @@
 import os.path
 from elyxer.io.fileline import *
 from elyxer.util.options import *
+from elyxer.util.buildcache import *
 from elyxer.gen.factory import *
 from elyxer.gen.toc import *
 from elyxer.gen.inset import *
@@ -35,6 +36,9 @@ from elyxer.gen.integral import *
 from elyxer.gen.splitpart import *
 from elyxer.proc.process import *
 from elyxer.maths.postformula import *
+from elyxer.maths.pool import *
+from elyxer.main.batch import *
+from elyxer.main.serve import *
 
 
 class eLyXerConverter(object):
@@ -42,12 +46,15 @@ class eLyXerConverter(object):
 
   def __init__(self):
     self.filtering = False
+    self.factory = None
+    self.cache = None
 
   def setio(self, ioparser):
     "Set the InOutParser"
     self.reader = ioparser.getreader()
     self.basket = self.getbasket()
     self.basket.setwriter(ioparser.getwriter())
+    self.cache = BuildCache.create(ioparser.filein, ioparser.fileout)
     return self
 
   def getbasket(self):
@@ -72,6 +79,9 @@ class eLyXerConverter(object):
 
   def convert(self):
     "Perform the conversion for the document"
+    if self.cache and self.cache.isuptodate():
+      Trace.message('Document ' + self.cache.fileout + ' is up to date')
+      return
     try:
       self.processcontents()
     except (Exception):
@@ -81,20 +91,68 @@ class eLyXerConverter(object):
       Trace.error(version)
       Trace.error('Conversion failed at ' + self.reader.currentline())
       raise
+    if self.cache:
+      self.cache.store()
 
   def processcontents(self):
     "Parse the contents and write it by containers"
-    factory = ContainerFactory()
+    if not self.factory:
+      self.factory = ContainerFactory()
     processor = Processor(self.filtering)
+    pool = None
+    if not self.filtering:
+      pool = FormulaPool.create()
+    if pool:
+      self.processahead(processor, pool)
     while not self.reader.finished():
-      container = factory.createcontainer(self.reader)
+      container = self.factory.createcontainer(self.reader)
       result = processor.process(container)
       self.writecontainer(result)
     result = processor.postprocess(None)
     self.writecontainer(result)
     if not self.filtering:
+      Trace.debug(unicode(FormulaCache.instance))
+      ImageQueue.current.finish()
       self.basket.finish()
 
+  def processahead(self, processor, pool):
+    "Parse windows of containers ahead of processing them, so that the pool"
+    "renders their formulas meanwhile. Containers are still processed one"
+    "after another in document order, so numbering and labels do not change."
+    FormulaCache.pool = pool
+    try:
+      try:
+        ahead = []
+        while len(ahead) > 0 or not self.reader.finished():
+          window = ahead or self.readwindow(pool)
+          ahead = []
+          if not isinstance(window[-1][0], LyXHeader):
+            ahead = self.readwindow(pool)
+          for container, prefix in window:
+            # trace messages show the line where the container was parsed
+            Trace.prefix = prefix
+            self.writecontainer(processor.process(container))
+        Trace.prefix = self.reader
+      except:
+        pool.terminate()
+        raise
+    finally:
+      FormulaCache.pool = None
+    pool.close()
+    Trace.debug(unicode(pool))
+
+  def readwindow(self, pool):
+    "Parse a window of containers and submit their formulas to the pool."
+    "Stop after the header: it sets the document parameters used for parsing."
+    window = []
+    while len(window) < pool.window and not self.reader.finished():
+      container = self.factory.createcontainer(self.reader)
+      window.append((container, unicode(self.reader)))
+      if isinstance(container, LyXHeader):
+        break
+    pool.submit([container for container, prefix in window if container])
+    return window
+
   def writecontainer(self, container):
     "Write each container to the correct basket."
     if not container:
@@ -184,13 +242,65 @@ class ConverterFactory(object):
 
 IncludeInset.converterfactory = ConverterFactory()
 
+class FileConverter(object):
+  "Convert a file into another, reusing the same container factory."
+
+  def __init__(self):
+    self.factory = None
+
+  def prepare(self):
+    "Build the container factory, if not done yet."
+    if not self.factory:
+      self.factory = ContainerFactory()
+    return self
+
+  def convert(self, filein, fileout):
+    "Convert the given input file into the output file."
+    self.prepare()
+    ConversionContext().activate()
+    directory = Options.directory
+    destdirectory = Options.destdirectory
+    try:
+      ioparser = InOutParser().parse([filein, fileout])
+      converter = eLyXerConverter().setio(ioparser)
+      converter.factory = self.factory
+      converter.convert()
+    finally:
+      Options.directory = directory
+      Options.destdirectory = destdirectory
+
+BatchJob.converter = FileConverter()
+
 def convertdoc(args):
   "Read a whole document from the command line and write it."
   Options().parseoptions(args)
+  if Options.batch:
+    convertbatch(args)
+    return
+  if Options.serve:
+    convertserve(args)
+    return
   ioparser = InOutParser().parse(args)
   converter = eLyXerConverter().setio(ioparser)
   converter.convert()
 
+def convertbatch(args):
+  "Convert all documents in a directory or manifest given in the command line."
+  batch = BatchConverter()
+  jobs = batch.parse(args)
+  if jobs == None:
+    exit(1)
+  if not batch.convertall(jobs):
+    exit(1)
+
+def convertserve(args):
+  "Serve conversions on the socket given in the command line."
+  if len(args) > 0:
+    Trace.error('Unused arguments: ' + unicode(args))
+    exit(1)
+  if not ConversionServer(Options.serve).serve():
+    exit(1)
+
 def main():
   "Main function, called if invoked from the command line"
   convertdoc(list(sys.argv))
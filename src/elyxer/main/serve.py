@@ -0,0 +1,196 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer conversion server listening on a Unix socket.
+
+
+import os
+import sys
+import copy
+import signal
+import socket
+import StringIO
+from elyxer.util.trace import Trace
+from elyxer.util.options import *
+from elyxer.main.batch import *
+from elyxer.main.client import *
+
+
+class OptionsSnapshot(object):
+  "A copy of the values of all runtime options."
+
+  def __init__(self):
+    self.values = dict()
+
+  def read(self):
+    "Read the current values of all options."
+    for name, value in vars(Options).iteritems():
+      if not name.startswith('_') and not callable(value):
+        self.values[name] = copy.copy(value)
+    return self
+
+  def write(self):
+    "Restore all options to the values read, along with the trace modes."
+    for name, value in self.values.iteritems():
+      setattr(Options, name, copy.copy(value))
+    Options().settrace()
+    Trace.prefix = None
+
+class ConversionServer(object):
+  "Serve conversion requests through a Unix socket, keeping everything warm."
+  "Requests are served one at a time, since document state is global;"
+  "each request parses its own options on top of the default ones."
+
+  # default options, read before any command line is parsed
+  defaults = None
+  backlog = 16
+  # seconds to wait for a client to send its request
+  timeout = 30
+
+  def __init__(self, path):
+    "Set the path to the socket."
+    self.path = path
+    self.options = OptionsSnapshot().read()
+
+  def serve(self):
+    "Listen on the socket and serve requests until interrupted."
+    if os.path.exists(self.path):
+      Trace.error('Socket ' + self.path + ' already exists; is another server running?')
+      return False
+    BatchJob.converter.prepare()
+    signal.signal(signal.SIGTERM, self.terminate)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      try:
+        listener.bind(self.path)
+        listener.listen(ConversionServer.backlog)
+        Trace.message('Serving conversions on ' + self.path)
+        while True:
+          connection, address = listener.accept()
+          connection.settimeout(ConversionServer.timeout)
+          try:
+            self.serveconnection(connection)
+          finally:
+            connection.close()
+      except KeyboardInterrupt:
+        Trace.message('Server stopped')
+    finally:
+      listener.close()
+      os.remove(self.path)
+    return True
+
+  def terminate(self, signum, frame):
+    "Stop the server on a termination signal, so that the socket is removed."
+    raise KeyboardInterrupt()
+
+  def serveconnection(self, connection):
+    "Serve a single request coming through a connection."
+    "A request that cannot be read or understood gets an error reply;"
+    "so does a client that does not finish sending in time."
+    try:
+      reply = ConversionRequest(ConversionMessage(connection).receive()).serve()
+    except (ValueError, socket.timeout, socket.error), exception:
+      reply = ConversionRequest.invalid('Invalid request: ' + unicode(exception))
+    self.options.write()
+    Trace.message(reply['summary'])
+    del reply['summary']
+    try:
+      ConversionMessage(connection).send(reply)
+    except socket.error, exception:
+      Trace.error('Cannot send reply: ' + unicode(exception))
+
+class ConversionRequest(object):
+  "A request to convert a document, with its own options."
+
+  def __init__(self, request):
+    "Read the arguments and the working directory."
+    "Raise a ValueError if the request is not an object with the right fields."
+    if not isinstance(request, dict):
+      raise ValueError('not an object: ' + repr(request))
+    args = request.get('args', [])
+    if not isinstance(args, list):
+      raise ValueError('args is not a list: ' + repr(args))
+    for arg in args:
+      if not isinstance(arg, basestring):
+        raise ValueError('argument is not a string: ' + repr(arg))
+    self.args = [arg.encode('utf-8') for arg in args]
+    self.directory = request.get('directory', '.')
+    if not isinstance(self.directory, basestring):
+      raise ValueError('directory is not a string: ' + repr(self.directory))
+
+  def invalid(cls, message):
+    "Get the reply to a request that could not be served."
+    reply = dict()
+    reply['status'] = 1
+    reply['output'] = u''
+    reply['errors'] = message + u'\n'
+    reply['summary'] = message
+    return reply
+
+  invalid = classmethod(invalid)
+
+  def serve(self):
+    "Convert the document capturing all messages, and return the reply."
+    stdout = sys.stdout
+    stderr = sys.stderr
+    sys.stdout = StringIO.StringIO()
+    sys.stderr = StringIO.StringIO()
+    cwd = os.getcwd()
+    try:
+      try:
+        os.chdir(self.directory)
+        status, summary = self.convert()
+      except SystemExit, exception:
+        status, summary = exception.code or 0, 'Exited with ' + unicode(self.args)
+      except Exception, exception:
+        Trace.error(exception.__class__.__name__ + ': ' + unicode(exception))
+        status, summary = 1, 'Invalid request ' + unicode(self.args)
+    finally:
+      os.chdir(cwd)
+      output = sys.stdout.getvalue()
+      errors = sys.stderr.getvalue()
+      sys.stdout = stdout
+      sys.stderr = stderr
+    reply = dict()
+    reply['status'] = status
+    reply['output'] = output.decode('utf-8')
+    reply['errors'] = errors.decode('utf-8')
+    reply['summary'] = summary
+    return reply
+
+  def convert(self):
+    "Parse the options and convert the document; return status and summary."
+    ConversionServer.defaults.write()
+    args = ['elyxer.py'] + self.args
+    Options().parseoptions(args)
+    if len(args) != 2:
+      Trace.error('Usage: elyxer-client.py socket [options] filein fileout')
+      return 1, 'Invalid arguments ' + unicode(self.args)
+    job = BatchJob(args[0], args[1]).convert()
+    if job.error:
+      Trace.error('Failed ' + job.filein + ': ' + job.error)
+      return 1, 'Failed ' + job.filein + ': ' + job.error
+    summary = 'Converted ' + job.filein + ' to ' + job.fileout
+    return 0, summary + ' in ' + '%.2f' % job.elapsed + ' s'
+
+ConversionServer.defaults = OptionsSnapshot().read()
+
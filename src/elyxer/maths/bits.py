@@ -22,6 +22,8 @@
 # Alex 20090614
 # eLyXer formula bits
 
+import cPickle
+import cStringIO
 from elyxer.util.trace import Trace
 from elyxer.conf.config import *
 from elyxer.maths.formula import *
@@ -29,15 +31,18 @@ from elyxer.maths.formula import *
 
 class FormulaBit(Container):
   "A bit of a formula"
+  "There are many of them, so their usual attributes are kept in slots."
 
-  type = None
-  size = 1
-  original = ''
+  __slots__ = ('contents', 'output', 'parent', 'factory', 'type', 'size', 'original')
 
   def __init__(self):
     "The formula bit type can be 'alpha', 'number', 'font'."
     self.contents = []
-    self.output = ContentsOutput()
+    self.output = SharedOutputs.contents
+    self.parent = None
+    self.type = None
+    self.size = 1
+    self.original = ''
 
   def setfactory(self, factory):
     "Set the internal formula factory."
@@ -63,6 +68,19 @@ class FormulaBit(Container):
     self.size = max([element.size for element in self.contents])
     return self.size
 
+  def __getstate__(self):
+    "Get the state to store in a cache, without the formula factory."
+    state = dict(self.__dict__)
+    for name in FormulaBit.__slots__:
+      if name != 'factory' and hasattr(self, name):
+        state[name] = getattr(self, name)
+    return state
+
+  def __setstate__(self, state):
+    "Restore the state from a cache, including slots."
+    for name, value in state.iteritems():
+      setattr(self, name, value)
+
   def clone(self):
     "Return a copy of itself."
     return self.factory.parseformula(self.original)
@@ -71,6 +89,58 @@ class FormulaBit(Container):
     "Get a string representation"
     return self.__class__.__name__ + ' read in ' + self.original
 
+class FormulaCopier(object):
+  "Copies a tree of parsed formula bits, without parsing its text again."
+  "The tree is pickled once, and each copy is unpickled: much faster than"
+  "parsing. Containers outside the tree (like the definition of a macro, or"
+  "the parent of the tree) are not copied: the copies point to the originals."
+
+  def __init__(self, bit, *references):
+    "Pickle a bit, along with any references to bits inside it."
+    self.inside = set()
+    self.outside = []
+    stack = [bit]
+    while len(stack) > 0:
+      element = stack.pop()
+      self.inside.add(id(element))
+      stack += element.contents
+    stream = cStringIO.StringIO()
+    pickler = cPickle.Pickler(stream, 2)
+    pickler.inst_persistent_id = self.getoutside
+    pickler.dump((bit,) + references)
+    self.pickled = stream.getvalue()
+
+  def create(cls, bit, *references):
+    "Create a copier for a bit, or None if it is nested too deeply to pickle."
+    try:
+      return FormulaCopier(bit, *references)
+    except RuntimeError, exception:
+      Trace.debug('Cannot copy ' + bit.__class__.__name__ + ': ' + unicode(exception))
+      return None
+
+  create = classmethod(create)
+
+  def getoutside(self, value):
+    "Get an identifier for a container outside the tree, None for the rest."
+    if not isinstance(value, Container) or id(value) in self.inside:
+      return None
+    self.outside.append(value)
+    return len(self.outside) - 1
+
+  def copy(self, factory):
+    "Make a copy of the bit and the references, with the given factory."
+    unpickler = cPickle.Unpickler(cStringIO.StringIO(self.pickled))
+    unpickler.persistent_load = self.outside.__getitem__
+    copied = unpickler.load()
+    stack = [copied[0]]
+    while len(stack) > 0:
+      element = stack.pop()
+      if isinstance(element, FormulaBit):
+        element.factory = factory
+      stack += element.contents
+    copied[0].parent = None
+    return copied
+
 class TaggedBit(FormulaBit):
   "A tagged string in a formula"
 
@@ -94,6 +164,8 @@ class TaggedBit(FormulaBit):
 class FormulaConstant(Constant):
   "A constant string in a formula"
 
+  __slots__ = ('original', 'size', 'type')
+
   def __init__(self, string):
     "Set the constant string"
     Constant.__init__(self, string)
@@ -164,7 +236,7 @@ class FormulaNumber(FormulaBit):
 
   def parsebit(self, pos):
     "Parse a bunch of digits"
-    digits = pos.glob(lambda: pos.current().isdigit())
+    digits = pos.globnumber()
     self.add(FormulaConstant(digits))
     self.type = 'number'
 
@@ -231,16 +303,23 @@ class Bracket(FormulaBit):
     if not pos.checkfor(self.start):
       Trace.error('Bracket should start with ' + self.start + ' at ' + pos.identifier())
       return None
+    self.openbracket(pos)
+    innerparser(pos)
+    self.closebracket(pos)
+
+  def openbracket(self, pos):
+    "Parse the start mark, and set the ending for the contents."
     self.skiporiginal(self.start, pos)
     pos.pushending(self.ending)
-    innerparser(pos)
+
+  def closebracket(self, pos):
+    "Parse the end mark once the contents are finished."
     self.original += pos.popending(self.ending)
     self.computesize()
 
   def innerformula(self, pos):
     "Parse a whole formula inside the bracket"
-    while not pos.finished():
-      self.add(self.factory.parseany(pos))
+    self.factory.parsecontents(self, pos)
 
   def innertext(self, pos):
     "Parse some text inside the bracket, following textual rules."
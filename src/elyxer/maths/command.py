@@ -30,6 +30,7 @@ from elyxer.util.clone import *
 from elyxer.conf.config import *
 from elyxer.maths.formula import *
 from elyxer.maths.bits import *
+from elyxer.util.context import *
 
 
 class FormulaCommand(FormulaBit):
@@ -61,10 +62,10 @@ class FormulaCommand(FormulaBit):
 
   def parsewithcommand(self, command, pos):
     "Parse the command type once we have the command."
-    for type in FormulaCommand.types:
-      if command in type.commandmap:
-        return self.parsecommandtype(command, type, pos)
-    return None
+    type = CommandIndex.current.find(command)
+    if not type:
+      return None
+    return self.parsecommandtype(command, type, pos)
 
   def parsecommandtype(self, command, type, pos):
     "Parse a given command type."
@@ -286,3 +287,44 @@ FormulaCommand.types = [
     TextFunction, SpacedCommand,
     ]
 
+FormulaCache.impure += [LabelFunction]
+
+class CommandIndex(object):
+  "A merged index of commands, mapping each one to the type that parses it."
+  "When several types have the same command the first one in"
+  "FormulaCommand.types takes precedence, as if they were tried in order."
+  "The index is built on first use; commands defined afterwards (macros)"
+  "are added as they appear."
+
+  current = None
+
+  def __init__(self):
+    self.commands = None
+
+  def find(self, command):
+    "Find the type that parses a command, or None if there is none."
+    if self.commands == None:
+      self.build()
+    return self.commands.get(command)
+
+  def build(self):
+    "Build the index from the command maps of all types."
+    self.commands = dict()
+    for type in reversed(FormulaCommand.types):
+      self.commands.update(dict.fromkeys(type.commandmap, type))
+
+  def add(self, command, type):
+    "Add a new command for a type, unless an earlier type already has it."
+    if self.commands == None:
+      # will be found when the index is built
+      return
+    if command in self.commands:
+      existing = FormulaCommand.types.index(self.commands[command])
+      if existing < FormulaCommand.types.index(type):
+        return
+    self.commands[command] = type
+
+CommandIndex.current = CommandIndex()
+
+ConversionContext.register(CommandIndex, 'current', CommandIndex)
+
@@ -0,0 +1,264 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer batch conversion of formula corpora with a pool of processes.
+
+
+import sys
+import StringIO
+from elyxer.util.trace import Trace
+from elyxer.util.options import *
+from elyxer.util.context import *
+from elyxer.maths.formula import *
+
+
+def startconverter():
+  "Start a worker process with a clean conversion context."
+  ConversionContext().activate()
+
+def convertformula(text):
+  "Convert a formula to HTML, returning the HTML and a list of errors."
+  "The HTML is None if the conversion failed. After any errors or side effects"
+  "(like macro definitions) the context is reset, so that each formula is"
+  "converted on its own and one bad formula does not affect the rest."
+  stderr = sys.stderr
+  sys.stderr = StringIO.StringIO()
+  html = None
+  impure = False
+  try:
+    try:
+      whole = FormulaFactory().parseformula(text)
+      FormulaProcessor().process(whole)
+      html = ''.join(whole.gethtml())
+      impure = FormulaCache.instance.contains(whole, FormulaCache.impure)
+    except Exception, exception:
+      Trace.error(exception.__class__.__name__ + ': ' + unicode(exception))
+    errors = sys.stderr.getvalue().decode('utf-8').splitlines()
+  finally:
+    sys.stderr = stderr
+  if errors or impure:
+    ConversionContext.current.reset()
+  return html, [error.replace('* ', '', 1) for error in errors]
+
+class FormulaRecord(object):
+  "A formula to convert, along with its HTML and errors once converted."
+
+  def __init__(self, formula, number):
+    "Set the formula text (None if the record is not valid) and its number."
+    self.formula = formula
+    self.number = number
+    self.fields = None
+    self.html = None
+    self.errors = []
+    self.original = None
+
+  def invalid(self, error):
+    "Mark the record as invalid, with the given error."
+    self.formula = None
+    self.errors = [error]
+    return self
+
+class JSONRecords(object):
+  "Records as newline-delimited JSON: each line contains a formula as a string,"
+  "or an object with the formula in the key 'formula'. Results are objects with"
+  "the fields read plus 'html' (null if the conversion failed) and any 'errors'."
+
+  def read(self, file):
+    "Read all records in a file."
+    number = 0
+    for line in file:
+      number += 1
+      if line.strip() != '':
+        yield self.parse(line, number)
+
+  def parse(self, line, number):
+    "Parse a line into a record."
+    record = FormulaRecord(None, number)
+    record.fields = {'line':number}
+    import json
+    try:
+      value = json.loads(line)
+    except ValueError, exception:
+      return record.invalid('Invalid JSON: ' + unicode(exception))
+    if isinstance(value, basestring):
+      value = {'formula':value}
+    if not isinstance(value, dict) or not isinstance(value.get('formula'), basestring):
+      return record.invalid('No formula found')
+    record.formula = value['formula']
+    record.fields = value
+    return record
+
+  def write(self, file, record):
+    "Write the result for a record."
+    import json
+    fields = dict(record.fields)
+    fields['html'] = record.html
+    if len(record.errors) > 0:
+      fields['errors'] = record.errors
+    file.write(json.dumps(fields, sort_keys = True) + '\n')
+
+class NULRecords(object):
+  "Records separated by NUL characters: formulas are read and HTML is written."
+  "Failed formulas give an empty record; all errors are shown on standard error."
+
+  size = 65536
+
+  def read(self, file):
+    "Read all records in a file, a few at a time."
+    number = 0
+    pending = ''
+    while True:
+      data = file.read(self.size)
+      if not data:
+        break
+      parts = (pending + data).split('\0')
+      pending = parts.pop()
+      for part in parts:
+        number += 1
+        yield self.parse(part, number)
+    if pending != '':
+      yield self.parse(pending, number + 1)
+
+  def parse(self, part, number):
+    "Parse a single record."
+    record = FormulaRecord(None, number)
+    try:
+      record.formula = part.decode('utf-8')
+    except UnicodeDecodeError, exception:
+      return record.invalid('Invalid UTF-8: ' + unicode(exception))
+    return record
+
+  def write(self, file, record):
+    "Write the result for a record."
+    for error in record.errors:
+      Trace.error('Record ' + unicode(record.number) + ': ' + error)
+    html = record.html or ''
+    file.write(html.encode('utf-8') + '\0')
+
+class FormulaBatch(object):
+  "Convert a stream of formula records using a pool of worker processes."
+  "Records are read in blocks; each block is sent to the pool before the results"
+  "of the previous one are returned, so results stream out in input order while"
+  "workers are kept busy. Identical formulas are converted only once."
+
+  # records read at a time, formulas sent to a worker at a time
+  block = 1000
+  chunk = 50
+  # formulas remembered to find duplicates
+  maxsize = 100000
+
+  def __init__(self):
+    self.pool = None
+    self.context = None
+    self.originals = dict()
+    self.converted = 0
+    self.reused = 0
+
+  def convert(self, records):
+    "Convert all records, returning each one in order with its HTML and errors."
+    self.start()
+    try:
+      previous = None
+      for block in self.readblocks(records):
+        submitted = self.submit(block)
+        if previous:
+          for record in self.collect(*previous):
+            yield record
+        previous = submitted
+      if previous:
+        for record in self.collect(*previous):
+          yield record
+    except:
+      # yield is not allowed inside try/finally in Python 2.4
+      self.finish()
+      raise
+    self.finish()
+
+  def start(self):
+    "Start the pool of processes, or a context to convert in this process."
+    import multiprocessing
+    if Options.jobs == 1 or multiprocessing.current_process().daemon:
+      self.context = ConversionContext.current
+      ConversionContext().activate()
+      return
+    self.pool = multiprocessing.Pool(Options.jobs, startconverter)
+
+  def readblocks(self, records):
+    "Read the records in blocks."
+    block = []
+    for record in records:
+      block.append(record)
+      if len(block) == self.block:
+        yield block
+        block = []
+    if len(block) > 0:
+      yield block
+
+  def submit(self, block):
+    "Submit the new formulas in a block; repeated records refer to the original."
+    if len(self.originals) >= self.maxsize:
+      self.originals.clear()
+    originals = []
+    for record in block:
+      if record.formula == None:
+        continue
+      if record.formula in self.originals:
+        record.original = self.originals[record.formula]
+        continue
+      self.originals[record.formula] = record
+      originals.append(record)
+    if not self.pool:
+      return block, originals, None
+    texts = [record.formula for record in originals]
+    return block, originals, self.pool.map_async(convertformula, texts, self.chunk)
+
+  def collect(self, block, originals, result):
+    "Collect the results for a block of records."
+    if result:
+      results = result.get()
+    else:
+      results = [convertformula(record.formula) for record in originals]
+    for record, (html, errors) in zip(originals, results):
+      record.html = html
+      record.errors = errors
+    self.converted += len(originals)
+    for record in block:
+      if record.original:
+        record.html = record.original.html
+        record.errors = record.original.errors
+        record.original = None
+        self.reused += 1
+    return block
+
+  def finish(self):
+    "Close the pool, or go back to the previous context."
+    if self.pool:
+      self.pool.close()
+      self.pool.join()
+    elif self.context:
+      self.context.activate()
+
+  def __unicode__(self):
+    "Return a printable representation."
+    return 'Formula batch: ' + unicode(self.converted) + ' formulas converted, ' + \
+        unicode(self.reused) + ' repeated'
+
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer on-disk cache of processed formulas, shared across runs.
+
+
+import os
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
+from elyxer.util.trace import Trace
+from elyxer.util.options import *
+from elyxer.util.docparams import *
+from elyxer.conf.config import *
+
+
+class FormulaDiskCache(object):
+  "A cache of processed formulas stored on disk, one pickled file each."
+  "Files are spread in subdirectories by the first two chars of their key."
+  "Keys hash the formula, the display mode, the options that affect parsing,"
+  "the eLyXer version and the formula configuration. Files are written"
+  "atomically, so that many processes can share the same directory;"
+  "when the total size goes over the limit the least recently used are removed."
+
+  instance = None
+  extension = '.pickle'
+  megabyte = 1024 * 1024
+
+  def __init__(self, directory):
+    "Set the directory and compute the signature of the configuration."
+    self.directory = directory
+    self.signature = self.getsignature()
+    self.written = 0
+    self.hits = 0
+    self.misses = 0
+
+  def get(cls):
+    "Get the disk cache for the current options, or None if not enabled."
+    if not Options.formulacache:
+      return None
+    if not cls.instance or cls.instance.directory != Options.formulacache:
+      cls.instance = FormulaDiskCache(Options.formulacache)
+    return cls.instance
+
+  get = classmethod(get)
+
+  def load(self, text):
+    "Load the processed formula for some text, or None if not found."
+    filename = self.getfilename(text)
+    try:
+      filein = open(filename, 'rb')
+    except IOError:
+      self.misses += 1
+      return None
+    try:
+      try:
+        whole = pickle.load(filein)
+      finally:
+        filein.close()
+      # mark as recently used
+      os.utime(filename, None)
+    except Exception, exception:
+      Trace.debug('Invalid cached formula ' + filename + ': ' + unicode(exception))
+      self.misses += 1
+      return None
+    self.hits += 1
+    return whole
+
+  def store(self, text, whole):
+    "Store a processed formula for some text."
+    filename = self.getfilename(text)
+    try:
+      data = pickle.dumps(whole, 2)
+    except Exception, exception:
+      Trace.debug('Cannot cache formula ' + text + ': ' + unicode(exception))
+      return
+    dirname = os.path.dirname(filename)
+    try:
+      if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+      temp = filename + '.' + unicode(os.getpid())
+      fileout = open(temp, 'wb')
+      fileout.write(data)
+      fileout.close()
+      os.rename(temp, filename)
+    except (IOError, OSError), exception:
+      if not os.path.isdir(dirname):
+        Trace.error('Cannot write formula cache in ' + dirname + ': ' + unicode(exception))
+      return
+    self.written += len(data)
+    if self.written > self.getmaxsize() / 10:
+      self.evict()
+      self.written = 0
+
+  def evict(self):
+    "Remove the least recently used files until the cache fits in its size."
+    files = []
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(self.directory):
+      for filename in filenames:
+        if filename.endswith(self.extension):
+          path = os.path.join(dirpath, filename)
+          try:
+            stat = os.stat(path)
+          except OSError:
+            continue
+          files.append((stat.st_mtime, stat.st_size, path))
+          total += stat.st_size
+    maxsize = self.getmaxsize()
+    if total <= maxsize:
+      return
+    files.sort()
+    for mtime, size, path in files:
+      if total <= maxsize * 9 / 10:
+        return
+      try:
+        os.remove(path)
+      except OSError:
+        # already removed by another process
+        pass
+      total -= size
+
+  def getfilename(self, text):
+    "Get the name of the file for some text."
+    import hashlib
+    key = [self.signature, unicode(DocumentParameters.displaymode),
+        unicode(Options.simplemath), text]
+    digest = hashlib.sha1(u'\n'.join(key).encode('utf-8')).hexdigest()
+    return os.path.join(self.directory, digest[:2], digest[2:] + self.extension)
+
+  def getmaxsize(self):
+    "Get the maximum size of the cache in bytes."
+    return Options.formulacachesize * self.megabyte
+
+  def getsignature(self):
+    "Get a signature of the eLyXer version, the place where classes are"
+    "defined and the formula configuration."
+    import hashlib
+    values = [GeneralConfig.version['number'], GeneralConfig.version['date'], __name__]
+    for name in sorted(vars(FormulaConfig)):
+      if not name.startswith('_'):
+        values.append(name + '=' + repr(getattr(FormulaConfig, name)))
+    return hashlib.sha1(u'\n'.join(values).encode('utf-8')).hexdigest()
+
+  def __unicode__(self):
+    "Return a printable representation."
+    return 'Formula disk cache: ' + unicode(self.hits) + ' hits, ' + unicode(self.misses) + ' misses'
+
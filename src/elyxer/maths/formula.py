@@ -30,6 +30,8 @@ from elyxer.util.docparams import *
 from elyxer.conf.config import *
 from elyxer.parse.formulaparse import *
 from elyxer.proc.formulaproc import *
+from elyxer.util.context import *
+from elyxer.maths.diskcache import *
 
 
 class Formula(Container):
@@ -79,8 +81,7 @@ class Formula(Container):
 
   def classic(self):
     "Make the contents using classic output generation with XHTML and CSS."
-    whole = FormulaFactory().parseformula(self.parsed)
-    FormulaProcessor().process(whole)
+    whole = FormulaCache.instance.create(self.parsed)
     whole.parent = self
     self.contents = [whole]
 
@@ -130,7 +131,7 @@ class Formula(Container):
   def parseupto(self, pos, limit):
     "Parse a formula that ends with the given command."
     pos.pushending(limit)
-    self.parsed = pos.glob(lambda: True)
+    self.parsed = pos.globchars(lambda char: True)
     pos.popending(limit)
 
   def __unicode__(self):
@@ -148,8 +149,7 @@ class WholeFormula(FormulaBit):
 
   def parsebit(self, pos):
     "Parse with any formula bit"
-    while not pos.finished():
-      self.add(self.factory.parseany(pos))
+    self.factory.parsecontents(self, pos)
 
 class FormulaFactory(object):
   "Construct bits of formula"
@@ -158,22 +158,24 @@ class FormulaFactory(object):
   types = [FormulaSymbol, RawText, FormulaNumber, Bracket, Comment, WhiteSpace]
   skippedtypes = [Comment, WhiteSpace]
   defining = False
-
-  def __init__(self):
-    "Initialize the map of instances."
-    self.instances = dict()
+  # candidate types for each first character, filled as characters are found
+  dispatch = dict()
+  skipping = dict()
+  # one instance of each type, shared to detect bits without creating them
+  detectors = dict()
 
   def detecttype(self, type, pos):
     "Detect a bit of a given type."
     if pos.finished():
       return False
-    return self.instance(type).detect(pos)
+    return self.detector(type).detect(pos)
 
-  def instance(self, type):
-    "Get an instance of the given type."
-    if not type in self.instances or not self.instances[type]:
-      self.instances[type] = self.create(type)
-    return self.instances[type]
+  def detector(self, type):
+    "Get the instance of the given type used to detect bits."
+    "Detection does not change the bit, so one instance per type is shared."
+    if not type in FormulaFactory.detectors:
+      FormulaFactory.detectors[type] = Cloner.create(type)
+    return FormulaFactory.detectors[type]
 
   def create(self, type):
     "Create a new formula bit of the given type."
@@ -188,23 +190,64 @@ class FormulaFactory(object):
 
   def skipany(self, pos):
     "Skip any skipped types."
-    for type in self.skippedtypes:
-      if self.instance(type).detect(pos):
+    for type in self.getcandidates(pos.current(), FormulaFactory.skipping, self.skippedtypes):
+      if self.detector(type).detect(pos):
         return self.parsetype(type, pos)
     return None
 
   def parseany(self, pos):
     "Parse any formula bit at the current location."
-    for type in self.types + self.skippedtypes:
-      if self.detecttype(type, pos):
-        return self.parsetype(type, pos)
+    type = self.detectany(pos)
+    if type:
+      return self.parsetype(type, pos)
     Trace.error('Unrecognized formula at ' + pos.identifier())
     return FormulaConstant(pos.skipcurrent())
 
+  def detectany(self, pos):
+    "Detect the type of formula bit at the current location, or None."
+    if pos.finished():
+      return None
+    candidates = self.getcandidates(pos.current(), FormulaFactory.dispatch,
+        self.types + self.skippedtypes)
+    for type in candidates:
+      if self.detector(type).detect(pos):
+        return type
+    return None
+
+  def parsecontents(self, bit, pos):
+    "Parse any formula bits into a bit until the position is finished."
+    "Nested brackets are parsed with a stack instead of recursion,"
+    "so their depth is not limited by Python's recursion limit."
+    stack = [bit]
+    while len(stack) > 0:
+      if pos.finished():
+        bracket = stack.pop()
+        if len(stack) > 0:
+          bracket.closebracket(pos)
+          stack[-1].add(bracket)
+        continue
+      type = self.detectany(pos)
+      if type is Bracket:
+        bracket = self.create(Bracket)
+        bracket.openbracket(pos)
+        stack.append(bracket)
+      elif type:
+        stack[-1].add(self.parsetype(type, pos))
+      else:
+        stack[-1].add(self.parseany(pos))
+
+  def getcandidates(self, char, table, types):
+    "Get the types (in order) that can start with the given character."
+    "Bits are detected on their first character: each type is probed once"
+    "on a position containing just that character, and the result is kept."
+    if not char in table:
+      probe = TextPosition(char)
+      table[char] = [type for type in types if self.detector(type).detect(probe)]
+    return table[char]
+
   def parsetype(self, type, pos):
     "Parse the given type and return it."
-    bit = self.instance(type)
-    self.instances[type] = None
+    bit = self.create(type)
     returnedbit = bit.parsebit(pos)
     if returnedbit:
       return returnedbit.setfactory(self)
@@ -223,3 +266,103 @@ class FormulaFactory(object):
       whole.add(TaggedBit().constant(formula, 'span class="unknown"'))
     return whole
 
+ConversionContext.registerinitial(FormulaFactory, 'defining')
+
+class FormulaCache(object):
+  "A bounded cache of parsed and processed formulas, to reuse repeated ones."
+  "Formulas are keyed on their text, the display mode, the options that affect"
+  "parsing and the generation of macro definitions. Formulas containing bits"
+  "with side effects (labels, tags, counters, macro definitions) are not cached;"
+  "those that depend on the document (macros) are not stored on disk, and"
+  "formulas that name any macro defined in the document skip the disk entirely."
+
+  instance = None
+  maxsize = 1000
+  # types of bits with side effects will be appended later
+  impure = []
+  # types of bits that depend on the document will be appended later
+  local = []
+  # a pool that renders formulas in advance, set in pool.py
+  pool = None
+  # the class that holds macro definitions, set in macro.py
+  definitions = None
+
+  def __init__(self):
+    self.formulas = dict()
+    self.generation = 0
+    self.clock = 0
+    self.hits = 0
+    self.misses = 0
+
+  def create(self, text):
+    "Get the processed formula for some text, from the cache if possible."
+    key = (text, DocumentParameters.displaymode, Options.simplemath, self.generation)
+    self.clock += 1
+    if key in self.formulas:
+      self.hits += 1
+      entry = self.formulas[key]
+      entry[1] = self.clock
+      return entry[0]
+    self.misses += 1
+    disk = FormulaDiskCache.get()
+    if disk and self.usesmacros(text):
+      disk = None
+    whole = None
+    if disk:
+      whole = disk.load(text)
+    if not whole and FormulaCache.pool:
+      whole = FormulaCache.pool.load(text)
+      if whole and disk:
+        disk.store(text, whole)
+    if not whole:
+      whole = FormulaFactory().parseformula(text)
+      FormulaProcessor().process(whole)
+      if disk and not self.contains(whole, FormulaCache.impure + FormulaCache.local):
+        disk.store(text, whole)
+    if not self.contains(whole, FormulaCache.impure):
+      self.store(key, whole)
+    return whole
+
+  def usesmacros(self, text):
+    "Find out if the text may use any macros defined in the document."
+    if not FormulaCache.definitions:
+      return False
+    for name in FormulaCache.definitions.macros:
+      if name in text:
+        return True
+    return False
+
+  def contains(self, whole, types):
+    "Find out if a formula contains any bits of the given types."
+    found = []
+    types = tuple(types)
+    whole.locateprocess(lambda bit: isinstance(bit, types), found.append)
+    return len(found) > 0
+
+  def store(self, key, whole):
+    "Store a formula, evicting the least recently used if full."
+    if len(self.formulas) >= self.maxsize:
+      self.evict()
+    self.formulas[key] = [whole, self.clock]
+
+  def evict(self):
+    "Evict the least recently used quarter of all formulas."
+    entries = sorted(self.formulas.items(), key = lambda item: item[1][1])
+    for key, entry in entries[:len(entries) / 4 + 1]:
+      del self.formulas[key]
+
+  def invalidate(self):
+    "Start a new generation after a macro is defined: cached formulas are not reused."
+    self.generation += 1
+
+  def __unicode__(self):
+    "Return a printable representation."
+    string = 'Formula cache: ' + unicode(self.hits) + ' hits, ' + unicode(self.misses) + ' misses'
+    if FormulaDiskCache.get():
+      string += '; ' + unicode(FormulaDiskCache.get())
+    return string
+
+FormulaCache.instance = FormulaCache()
+
+ConversionContext.register(FormulaCache, 'instance', FormulaCache)
+
@@ -28,6 +28,7 @@ from elyxer.parse.formulaparse import *
 from elyxer.parse.headerparse import *
 from elyxer.maths.formula import *
 from elyxer.maths.hybrid import *
+from elyxer.util.context import *
 
 
 class MacroDefinition(CommandBit):
@@ -40,12 +41,15 @@ class MacroDefinition(CommandBit):
     self.output = EmptyOutput()
     self.parameternumber = 0
     self.defaults = []
+    self.template = None
     self.factory.defining = True
     self.parseparameters(pos)
     self.factory.defining = False
     Trace.debug('New command ' + self.newcommand + ' (' + \
         unicode(self.parameternumber) + ' parameters)')
     self.macros[self.newcommand] = self
+    CommandIndex.current.add(self.newcommand, MacroFunction)
+    FormulaCache.instance.invalidate()
 
   def parseparameters(self, pos):
     "Parse all optional parameters (number of parameters, default values)"
@@ -73,9 +77,22 @@ class MacroDefinition(CommandBit):
     Trace.error('Unknown formula bit in defining function at ' + pos.identifier())
     return 'unknown'
 
-  def instantiate(self):
-    "Return an instance of the macro."
-    return self.definition.clone()
+  def instantiate(self, factory):
+    "Return an instance of the macro, and the parameters in it."
+    "The definition is parsed again only when new macros have been defined"
+    "since the last time, as they may change its meaning; otherwise the"
+    "instance is a copy of the last parsed template. Templates nested too"
+    "deeply to be copied are parsed every time."
+    generation = FormulaCache.instance.generation
+    if not self.template or self.generation != generation:
+      self.generation = generation
+      template = self.definition.clone()
+      parameters = template.searchall(MacroParameter)
+      self.template = FormulaCopier.create(template, *parameters)
+      if not self.template:
+        return template, parameters
+    copied = self.template.copy(factory)
+    return copied[0], copied[1:]
 
 class MacroParameter(FormulaBit):
   "A parameter from elyxer.a macro."
@@ -156,31 +173,54 @@ class MacroFunction(CommandBit):
     for digit in number.original:
       value = self.factory.create(FormulaNumber)
       value.add(FormulaConstant(digit))
-      value.type = number
+      value.type = 'number'
       self.values.append(value)
     return None
 
   def completemacro(self, macro):
     "Complete the macro with the parameters read."
-    self.contents = [macro.instantiate()]
+    instance, parameters = macro.instantiate(self.factory)
+    self.contents = [instance]
     replaced = [False] * len(self.values)
-    for parameter in self.searchall(MacroParameter):
+    copiers = dict()
+    for parameter in parameters:
       index = parameter.number - 1
       if index >= len(self.values):
         Trace.error('Macro parameter index out of bounds: ' + unicode(index))
         return
+      parameter.contents = [self.placevalue(index, replaced[index], copiers)]
       replaced[index] = True
-      parameter.contents = [self.values[index].clone()]
     for index in range(len(self.values)):
       if not replaced[index]:
         self.addfilter(index, self.values[index])
 
+  def placevalue(self, index, replaced, copiers):
+    "Get the value of a parameter to place in the macro, without parsing it again."
+    "Square brackets are cloned. Other values go into a whole formula: as they"
+    "are the first time, and copied when the parameter is used again"
+    "(or parsed again if nested too deeply to be copied)."
+    value = self.values[index]
+    if isinstance(value, SquareBracket):
+      return value.clone()
+    if replaced:
+      if not index in copiers:
+        copiers[index] = FormulaCopier.create(value)
+      if not copiers[index]:
+        return value.clone()
+      value = copiers[index].copy(self.factory)[0]
+    whole = self.factory.create(WholeFormula)
+    whole.add(value)
+    return whole
+
   def addfilter(self, index, value):
     "Add a filter for the given parameter number and parameter value."
     original = '#' + unicode(index + 1)
     value = ''.join(self.values[0].gethtml())
     self.output.addfilter(original, value)
 
+ConversionContext.register(MacroDefinition, 'macros', dict,
+    (MacroFunction, 'commandmap'))
+
 class FormulaMacro(Formula):
   "A math macro defined in an inset."
 
@@ -194,6 +234,10 @@ class FormulaMacro(Formula):
 
 FormulaFactory.types += [ MacroParameter ]
 
+FormulaCache.impure += [MacroDefinition]
+FormulaCache.local += [MacroFunction]
+FormulaCache.definitions = MacroDefinition
+
 FormulaCommand.types += [
     MacroFunction,
     ]
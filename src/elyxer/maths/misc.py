@@ -65,3 +65,5 @@ class MiscCommand(CommandBit):
 
 FormulaCommand.types += [MiscCommand]
 
+FormulaCache.impure += [SetCounterFunction, FormulaTag]
+
@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer pool of processes that render formulas in advance.
+
+
+import sys
+import StringIO
+from elyxer.util.trace import Trace
+from elyxer.util.options import *
+from elyxer.util.docparams import *
+from elyxer.util.context import *
+from elyxer.maths.formula import *
+from elyxer.maths.macro import *
+
+
+def startworker():
+  "Start a worker process with a clean conversion context."
+  ConversionContext().activate()
+  Trace.prefix = None
+
+def renderformula(key):
+  "Render a formula in a worker process: parse and process its text."
+  "Return None if it cannot be rendered in advance: if it has bits"
+  "with side effects or that depend on the document, or if any errors"
+  "were traced (they will be traced again in document order)."
+  text, displaymode = key
+  DocumentParameters.displaymode = displaymode
+  stderr = sys.stderr
+  sys.stderr = StringIO.StringIO()
+  try:
+    whole = FormulaFactory().parseformula(text)
+    FormulaProcessor().process(whole)
+    errors = sys.stderr.getvalue()
+  finally:
+    sys.stderr = stderr
+  if errors or FormulaCache.instance.contains(whole, FormulaCache.impure + FormulaCache.local):
+    # side effects may have changed the worker state: start afresh
+    startworker()
+    return None
+  return whole
+
+class FormulaPool(object):
+  "A pool of worker processes that render formulas before they are processed."
+  "Formulas are submitted as soon as their containers are parsed; when the"
+  "formula cache misses it loads the rendered formula instead of parsing it."
+  "Workers do not know the macros in the document, so formulas that use"
+  "any of them at the time they are loaded are parsed again as usual."
+
+  # containers parsed ahead, and formulas sent to a worker at a time
+  window = 100
+  chunk = 8
+
+  def __init__(self, jobs):
+    "Start the pool with the given number of processes."
+    import multiprocessing
+    self.pool = multiprocessing.Pool(jobs, startworker)
+    self.pending = dict()
+    self.submitted = 0
+    self.loaded = 0
+
+  def create(cls):
+    "Create a pool for the current options, or None if not enabled."
+    if not Options.formulajobs:
+      return None
+    if Options.jsmath or Options.mathjax or Options.googlecharts:
+      return None
+    import multiprocessing
+    if multiprocessing.current_process().daemon:
+      # inside a batch worker: cannot have processes of its own
+      return None
+    return FormulaPool(Options.formulajobs)
+
+  create = classmethod(create)
+
+  def submit(self, containers):
+    "Submit all formulas in the given containers for rendering."
+    keys = []
+    for container in containers:
+      container.locateprocess(self.isformula, lambda formula: self.addkey(formula, keys))
+    for start in range(0, len(keys), self.chunk):
+      chunk = keys[start:start + self.chunk]
+      result = self.pool.map_async(renderformula, chunk)
+      self.submitted += len(chunk)
+      for index, key in enumerate(chunk):
+        self.pending[key] = (result, index)
+
+  def isformula(self, container):
+    "Find out if a container is a formula that can be rendered in advance."
+    return container.__class__ is Formula
+
+  def addkey(self, formula, keys):
+    "Add the key for a formula, unless already waiting to be loaded."
+    key = (formula.parsed, formula.header[0] != 'inline')
+    if key in self.pending:
+      return
+    self.pending[key] = None
+    keys.append(key)
+
+  def load(self, text):
+    "Load the rendered formula for some text, or None if not available."
+    key = (text, DocumentParameters.displaymode)
+    if not key in self.pending:
+      return None
+    result, index = self.pending.pop(key)
+    try:
+      whole = result.get()[index]
+    except Exception, exception:
+      # very deeply nested formulas cannot be pickled back from the workers
+      Trace.debug('Cannot load rendered formula: ' + unicode(exception))
+      return None
+    if not whole or FormulaCache.instance.usesmacros(text):
+      return None
+    self.loaded += 1
+    return whole
+
+  def close(self):
+    "Wait for all workers to finish and close the pool."
+    self.pool.close()
+    self.pool.join()
+
+  def terminate(self):
+    "Stop all workers right away."
+    self.pool.terminate()
+    self.pool.join()
+
+  def __unicode__(self):
+    "Return a printable representation."
+    return 'Formula pool: ' + unicode(self.loaded) + ' of ' + \
+        unicode(self.submitted) + ' formulas rendered in advance'
@@ -27,17 +27,30 @@ from elyxer.util.trace import Trace
 
 class ContainerOutput(object):
   "The generic HTML output for a container."
+  "Outputs without any state have no slots, so that they can be shared."
+
+  __slots__ = ()
 
   def gethtml(self, container):
     "Show an error."
     Trace.error('gethtml() not implemented for ' + unicode(self))
 
+  def iterhtml(self, container):
+    "Iterate over the HTML code: by default, the list returned by gethtml()."
+    html = self.gethtml(container)
+    if isinstance(html, basestring):
+      Trace.error('Raw string ' + html)
+      return [html]
+    return html
+
   def isempty(self):
     "Decide if the output is empty: by default, not empty."
     return False
 
 class EmptyOutput(ContainerOutput):
 
+  # no slots: a hidden formula (FormulaMacro) can still get a tag
+
   def gethtml(self, container):
     "Return empty HTML code."
     return []
@@ -49,6 +62,8 @@ class EmptyOutput(ContainerOutput):
 class FixedOutput(ContainerOutput):
   "Fixed output"
 
+  __slots__ = ()
+
   def gethtml(self, container):
     "Return constant HTML code"
     return container.html
@@ -56,17 +71,64 @@ class FixedOutput(ContainerOutput):
 class ContentsOutput(ContainerOutput):
   "Outputs the contents converted to HTML"
 
+  __slots__ = ()
+
   def gethtml(self, container):
     "Return the HTML code"
-    html = []
+    return list(self.iterhtml(container))
+
+  def iterhtml(self, container):
+    "Iterate over the HTML code of all contents, without building lists."
+    "Elements with plain contents, tagged or string outputs are walked with"
+    "a stack instead of recursion; as with recursion, each line is escaped"
+    "once for every element that contains it."
     if container.contents == None:
-      return html
-    for element in container.contents:
-      if not hasattr(element, 'gethtml'):
+      return
+    stack = [(container, iter(container.contents), None)]
+    inside = []
+    while len(stack) > 0:
+      parent, elements, tagged = stack[-1]
+      finished = True
+      for element in elements:
+        finished = False
+        break
+      if not finished and not hasattr(element, 'iterhtml'):
         Trace.error('No html in ' + element.__class__.__name__ + ': ' + unicode(element))
-        return html
-      html += element.gethtml()
-    return html
+        finished = True
+      if finished:
+        if tagged:
+          yield self.escapeinside(tagged.close(parent), inside)
+        stack.pop()
+        if len(inside) > 0:
+          inside.pop()
+        continue
+      kind = element.output.__class__
+      if kind is StringOutput:
+        yield self.escapeinside(element.escapeline(element.string), inside)
+      elif kind is ContentsOutput:
+        stack.append((element, self.itercontents(element), None))
+        inside.append(element)
+      elif kind is TaggedOutput and element.output.empty:
+        yield self.escapeinside(element.escapeline(element.output.selfclosing(element)), inside)
+      elif kind is TaggedOutput:
+        stack.append((element, self.itercontents(element), element.output))
+        inside.append(element)
+        yield self.escapeinside(element.output.open(element), inside)
+      else:
+        for line in element.iterhtml():
+          yield self.escapeinside(line, inside)
+
+  def itercontents(self, container):
+    "Iterate over the contents of a container, if any."
+    if container.contents == None:
+      return iter([])
+    return iter(container.contents)
+
+  def escapeinside(self, line, inside):
+    "Escape a line for every element it is inside, innermost first."
+    for element in reversed(inside):
+      line = element.escapeline(line)
+    return line
 
 class TaggedOutput(ContentsOutput):
   "Outputs an HTML tag surrounding the contents."
@@ -89,14 +151,15 @@ class TaggedOutput(ContentsOutput):
     self.breaklines = breaklines
     return self
 
-  def gethtml(self, container):
-    "Return the HTML code."
+  def iterhtml(self, container):
+    "Iterate over the HTML code."
     if self.empty:
-      return [self.selfclosing(container)]
-    html = [self.open(container)]
-    html += ContentsOutput.gethtml(self, container)
-    html.append(self.close(container))
-    return html
+      yield self.selfclosing(container)
+      return
+    yield self.open(container)
+    for line in ContentsOutput.iterhtml(self, container):
+      yield line
+    yield self.close(container)
 
   def open(self, container):
     "Get opening line."
@@ -146,13 +209,10 @@ class FilteredOutput(ContentsOutput):
     "Add a new filter: replace the original by the replacement."
     self.filters.append((original, replacement))
 
-  def gethtml(self, container):
-    "Return the HTML code"
-    result = []
-    html = ContentsOutput.gethtml(self, container)
-    for line in html:
-      result.append(self.filter(line))
-    return result
+  def iterhtml(self, container):
+    "Iterate over the HTML code, filtered."
+    for line in ContentsOutput.iterhtml(self, container):
+      yield self.filter(line)
 
   def filter(self, line):
     "Filter a single line with all available filters."
@@ -164,7 +224,16 @@ class FilteredOutput(ContentsOutput):
 class StringOutput(ContainerOutput):
   "Returns a bare string as output"
 
+  __slots__ = ()
+
   def gethtml(self, container):
     "Return a bare string"
     return [container.string]
 
+class SharedOutputs(object):
+  "Outputs without state, shared by the many containers that use them."
+
+  contents = ContentsOutput()
+  empty = EmptyOutput()
+  string = StringOutput()
+
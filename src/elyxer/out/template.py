@@ -30,6 +30,8 @@ from elyxer.util.options import *
 from elyxer.util.translate import *
 from elyxer.util.docparams import *
 from elyxer.out.output import *
+from elyxer.util.context import *
+from elyxer.util.buildcache import *
 
 
 class HTMLTemplate(object):
@@ -74,6 +76,8 @@ class HTMLTemplate(object):
 
   get = classmethod(get)
 
+ConversionContext.registerinitial(HTMLTemplate, 'current')
+
 class RawTemplate(HTMLTemplate):
   "The template for raw output."
 
@@ -109,6 +113,7 @@ class FileTemplate(HTMLTemplate):
 
   def templatelines(self):
     "Read all lines in the template, separate content into its own line."
+    Dependencies.add(Options.template)
     template = BulkFile(Options.template).readall()
     for line in template:
       if not FileTemplate.divider in line:
@@ -193,6 +198,7 @@ class DefaultTemplate(HTMLTemplate):
       if cssdoc != '':
         html.append(u'<link rel="stylesheet" href="' + cssdoc + '" type="text/css" media="all"/>\n')
     for cssfile in Options.embedcss:
+      Dependencies.add(cssfile)
       html.append(u'<style type="text/css">\n')
       html += BulkFile(cssfile).readall()
       html.append(u'</style>\n')
@@ -294,6 +300,8 @@ class DocumentTitle(object):
       return DocumentParameters.pdftitle
     return 'Converted document'
 
+ConversionContext.registerinitial(DocumentTitle, 'title')
+
 class DocumentAuthor(object):
   "The author of the document."
 
@@ -309,6 +317,8 @@ class DocumentAuthor(object):
     "Get the document author."
     return DocumentAuthor.author
 
+ConversionContext.registerinitial(DocumentAuthor, 'author')
+
 class HeaderOutput(ContainerOutput):
   "Returns the HTML headers"
 
@@ -319,8 +329,10 @@ class HeaderOutput(ContainerOutput):
 class FooterOutput(ContentsOutput):
   "Return the HTML code for the footer"
 
-  def gethtml(self, container):
+  def iterhtml(self, container):
     "Footer HTML"
-    contents = ContentsOutput.gethtml(self, container)
-    return contents + HTMLTemplate.get().convertfooter()
+    for line in ContentsOutput.iterhtml(self, container):
+      yield line
+    for line in HTMLTemplate.get().convertfooter():
+      yield line
 
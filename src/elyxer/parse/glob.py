@@ -77,50 +77,57 @@ class Globable(object):
       glob += self.skipcurrent()
     return glob
 
+  def globchars(self, charcheck):
+    "Glob a bit of text where every char satisfies a check."
+    "The check receives the char; subclasses may find the end faster."
+    return self.glob(lambda: charcheck(self.current()))
+
   def globalpha(self):
     "Glob a bit of alpha text"
-    return self.glob(lambda: self.current().isalpha())
+    return self.globchars(lambda char: char.isalpha())
 
   def globnumber(self):
     "Glob a row of digits."
-    return self.glob(lambda: self.current().isdigit())
+    return self.globchars(lambda char: char.isdigit())
 
   def isidentifier(self):
     "Return if the current character is alphanumeric or _."
-    if self.current().isalnum() or self.current() == '_':
-      return True
-    return False
+    return self.isidentifierchar(self.current())
+
+  def isidentifierchar(self, char):
+    "Return if a character is alphanumeric or _."
+    return char.isalnum() or char == '_'
 
   def globidentifier(self):
     "Glob alphanumeric and _ symbols."
-    return self.glob(self.isidentifier)
+    return self.globchars(self.isidentifierchar)
 
   def isvalue(self):
     "Return if the current character is a value character:"
     "not a bracket or a space."
-    if self.current().isspace():
-      return False
-    if self.current() in '{}()':
-      return False
-    return True
+    return self.isvaluechar(self.current())
+
+  def isvaluechar(self, char):
+    "Return if a character is a value character: not a bracket or a space."
+    return not char.isspace() and not char in '{}()'
 
   def globvalue(self):
     "Glob a value: any symbols but brackets."
-    return self.glob(self.isvalue)
+    return self.globchars(self.isvaluechar)
 
   def skipspace(self):
     "Skip all whitespace at current position."
-    return self.glob(lambda: self.current().isspace())
+    return self.globchars(lambda char: char.isspace())
 
   def globincluding(self, magicchar):
     "Glob a bit of text up to (including) the magic char."
-    glob = self.glob(lambda: self.current() != magicchar) + magicchar
+    glob = self.globchars(lambda char: char != magicchar) + magicchar
     self.skip(magicchar)
     return glob
 
   def globexcluding(self, excluded):
     "Glob a bit of text up until (excluding) any excluded character."
-    return self.glob(lambda: self.current() not in excluded)
+    return self.globchars(lambda char: char not in excluded)
 
   def pushending(self, ending, optional = False):
     "Push a new ending to the bottom"
@@ -163,6 +170,16 @@ class EndingList(object):
       return True
     return False
 
+  def getchecked(self):
+    "Get the endings checked at any position, as strings:"
+    "from the last one, up to the first one that is not optional."
+    checked = []
+    for ending in reversed(self.endings):
+      checked.append(ending.ending)
+      if not ending.optional:
+        return checked
+    return checked
+
   def pop(self, pos):
     "Remove the ending at the current position"
     if pos.isout():
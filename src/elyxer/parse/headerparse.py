@@ -26,6 +26,7 @@ from elyxer.util.trace import Trace
 from elyxer.util.options import *
 from elyxer.conf.config import *
 from elyxer.parse.parser import *
+from elyxer.util.context import *
 
 
 class HeaderParser(Parser):
@@ -86,6 +87,8 @@ class PreambleParser(Parser):
     PreambleParser.preamble.append(reader.currentline())
     reader.nextline()
 
+ConversionContext.register(PreambleParser, 'preamble', list)
+
 class LstParser(object):
   "Parse global and local lstparams."
 
@@ -129,4 +132,5 @@ class LstParser(object):
         paramdict[key] = value
     return paramdict
 
+ConversionContext.register(LstParser, 'globalparams', dict)
 
@@ -22,9 +22,11 @@
 # Alex 20090203
 # eLyXer parsers
 
+import re
 from elyxer.util.trace import Trace
 from elyxer.util.options import *
 from elyxer.conf.config import *
+from elyxer.util.context import *
 
 
 class Parser(object):
@@ -115,37 +117,41 @@ class TextParser(Parser):
   "A parser for a command and a bit of text"
 
   stack = []
+  firstword = re.compile(r'\s*(\S+)', re.UNICODE)
+  alwaysending = frozenset([ContainerConfig.endings['Layout'], ContainerConfig.endings['Inset']])
 
   def __init__(self, container):
     Parser.__init__(self)
     self.ending = None
     if container.__class__.__name__ in ContainerConfig.endings:
       self.ending = ContainerConfig.endings[container.__class__.__name__]
-    self.endings = []
+    self.endings = frozenset()
 
   def parse(self, reader):
     "Parse lines as long as they are text"
     TextParser.stack.append(self.ending)
-    self.endings = TextParser.stack + [ContainerConfig.endings['Layout'],
-        ContainerConfig.endings['Inset'], self.ending]
+    self.endings = TextParser.alwaysending.union(TextParser.stack)
     contents = []
     while not self.isending(reader):
       self.parsecontainer(reader, contents)
     return contents
 
   def isending(self, reader):
-    "Check if text is ending"
-    current = reader.currentline().split()
-    if len(current) == 0:
+    "Check if text is ending: look only at the first word in the line."
+    match = TextParser.firstword.match(reader.currentline())
+    if not match:
       return False
-    if current[0] in self.endings:
-      if current[0] in TextParser.stack:
-        TextParser.stack.remove(current[0])
+    first = match.group(1)
+    if first in self.endings:
+      if first in TextParser.stack:
+        TextParser.stack.remove(first)
       else:
         TextParser.stack = []
       return True
     return False
 
+ConversionContext.register(TextParser, 'stack', list)
+
 class ExcludingParser(Parser):
   "A parser that excludes the final line"
 
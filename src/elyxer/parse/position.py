@@ -119,6 +119,38 @@ class TextPosition(Position):
       return None
     return self.text[self.pos : self.pos + length]
 
+  def globchars(self, charcheck):
+    "Glob a bit of text where every char satisfies a check."
+    "Scan the text directly, looking for endings only where one may start;"
+    "then slice the result once."
+    text = self.text
+    endings = self.endinglist.getchecked()
+    starts = set([ending[:1] for ending in endings])
+    end = self.pos
+    limit = len(text)
+    if '' in starts:
+      # an empty ending is found anywhere
+      limit = end
+    while end < limit:
+      char = text[end]
+      if char in starts and self.hasending(end, endings):
+        break
+      if not charcheck(char):
+        break
+      end += 1
+    glob = text[self.pos:end]
+    self.pos = end
+    # check for the ending at the end, as glob() does
+    self.finished()
+    return glob
+
+  def hasending(self, index, endings):
+    "Find out if any of the endings is found at the given index."
+    for ending in endings:
+      if self.text.startswith(ending, index):
+        return True
+    return False
+
 class FilePosition(Position):
   "A parse position based on an underlying file."
 
@@ -51,21 +51,37 @@ class FormulaProcessor(object):
 
   def processcontents(self, bit):
     "Process the contents of a formula bit."
+    "Each bit is processed before its contents, using a stack."
     if not isinstance(bit, FormulaBit):
       return
     bit.process()
-    for element in bit.contents:
-      self.processcontents(element)
+    stack = [iter(bit.contents)]
+    while len(stack) > 0:
+      for element in stack[-1]:
+        if isinstance(element, FormulaBit):
+          element.process()
+          stack.append(iter(element.contents))
+          break
+      else:
+        stack.pop()
 
   def processinsides(self, bit):
     "Process the insides (limits, brackets) in a formula bit."
+    "Each element is processed before its contents, using a stack."
     if not isinstance(bit, FormulaBit):
       return
-    for index, element in enumerate(bit.contents):
-      for processor in self.processors:
-        processor.process(bit.contents, index)
-      # continue with recursive processing
-      self.processinsides(element)
+    stack = [(bit, enumerate(bit.contents))]
+    while len(stack) > 0:
+      parent, elements = stack[-1]
+      for index, element in elements:
+        for processor in self.processors:
+          processor.process(parent.contents, index)
+        # continue with the contents of the element
+        if isinstance(element, FormulaBit):
+          stack.append((element, enumerate(element.contents)))
+          break
+      else:
+        stack.pop()
 
   def traversewhole(self, formula):
     "Traverse over the contents to alter variables and space units."
@@ -79,12 +95,17 @@ class FormulaProcessor(object):
 
   def traverse(self, bit):
     "Traverse a formula and yield a flattened structure of (bit, list) pairs."
-    for element in bit.contents:
-      if hasattr(element, 'type') and element.type:
-        yield (element, bit.contents)
-      elif isinstance(element, FormulaBit):
-        for pair in self.traverse(element):
-          yield pair
+    stack = [(bit, iter(bit.contents))]
+    while len(stack) > 0:
+      parent, elements = stack[-1]
+      for element in elements:
+        if hasattr(element, 'type') and element.type:
+          yield (element, parent.contents)
+        elif isinstance(element, FormulaBit):
+          stack.append((element, iter(element.contents)))
+          break
+      else:
+        stack.pop()
 
   def italicize(self, bit, contents):
     "Italicize the given bit of text."
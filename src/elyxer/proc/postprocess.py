@@ -25,24 +25,46 @@
 
 class Postprocessor(object):
   "Postprocess a container keeping some context"
+  "The stages are created once and shared with the postprocessors for"
+  "nested contents, which only keep their own last and current elements."
 
   stages = []
 
-  def __init__(self):
-    self.stages = StageDict(Postprocessor.stages, self)
+  def __init__(self, stages = None):
+    "Create the stages, unless they are given by an outer postprocessor."
+    if not stages:
+      stages = StageDict(Postprocessor.stages)
+    self.stages = stages
     self.current = None
     self.last = None
 
   def postprocess(self, next):
     "Postprocess a container and its contents."
     self.postrecursive(self.current)
+    return self.postnext(next)
+
+  def postnext(self, next):
+    "Postprocess the current container and move on to the next."
     result = self.postcurrent(next)
     self.last = self.current
     self.current = next
     return result
 
   def postrecursive(self, container):
-    "Postprocess the container contents recursively"
+    "Postprocess the container contents recursively."
+    "A stack of generators is used instead of recursion: each one yields"
+    "the elements whose contents must be postprocessed before going on."
+    stack = [self.postcontents(container)]
+    while len(stack) > 0:
+      for element in stack[-1]:
+        stack.append(self.postcontents(element))
+        break
+      else:
+        stack.pop()
+
+  def postcontents(self, container):
+    "Postprocess the contents of a container, yielding each element"
+    "before it is postprocessed itself."
     if not hasattr(container, 'contents'):
       return
     if len(container.contents) == 0:
@@ -50,15 +72,17 @@ class Postprocessor(object):
     if hasattr(container, 'postprocess'):
       if not container.postprocess:
         return
-    postprocessor = Postprocessor()
+    postprocessor = Postprocessor(self.stages)
     contents = []
     for element in container.contents:
-      post = postprocessor.postprocess(element)
+      yield postprocessor.current
+      post = postprocessor.postnext(element)
       if post:
         contents.append(post)
     # two rounds to empty the pipeline
     for i in range(2):
-      post = postprocessor.postprocess(None)
+      yield postprocessor.current
+      post = postprocessor.postnext(None)
       if post:
         contents.append(post)
     container.contents = contents
@@ -68,27 +92,26 @@ class Postprocessor(object):
     stage = self.stages.getstage(self.current)
     if not stage:
       return self.current
+    stage.postprocessor = self
     return stage.postprocess(self.last, self.current, next)
 
 class StageDict(object):
   "A dictionary of stages corresponding to classes"
 
-  def __init__(self, classes, postprocessor):
+  def __init__(self, classes):
     "Instantiate an element from elyxer.each class and store as a dictionary"
-    instances = self.instantiate(classes, postprocessor)
+    instances = self.instantiate(classes)
     self.stagedict = dict([(x.processedclass, x) for x in instances])
 
-  def instantiate(self, classes, postprocessor):
-    "Instantiate an element from elyxer.each class"
+  def instantiate(self, classes):
+    "Instantiate an element from elyxer.each class."
+    "Each stage gets the postprocessor that calls it, just before the call."
     stages = [x.__new__(x) for x in classes]
     for element in stages:
       element.__init__()
-      element.postprocessor = postprocessor
     return stages
 
   def getstage(self, element):
     "Get the stage for a given element, if the type is in the dict"
-    if not element.__class__ in self.stagedict:
-      return None
-    return self.stagedict[element.__class__]
+    return self.stagedict.get(element.__class__)
 
@@ -65,11 +65,18 @@ class Processor(object):
 
   def processcontainer(self, container):
     "Process a container and its contents, recursively."
+    "A stack is used instead of recursion: each container is processed"
+    "after all of its contents."
     if not container:
       return
-    for element in container.contents:
-      self.processcontainer(element)
-    container.process()
+    stack = [(container, iter(container.contents))]
+    while len(stack) > 0:
+      for element in stack[-1][1]:
+        if element:
+          stack.append((element, iter(element.contents)))
+          break
+      else:
+        stack.pop()[0].process()
 
   def postprocess(self, container):
     "Postprocess a container, unless filtering is on."
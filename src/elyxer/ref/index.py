@@ -31,6 +31,7 @@ from elyxer.gen.styles import *
 from elyxer.ref.link import *
 from elyxer.ref.partkey import *
 from elyxer.proc.process import *
+from elyxer.util.context import *
 
 
 class ListInset(Container):
@@ -49,6 +50,8 @@ class ListInset(Container):
 
   sortdictionary = classmethod(sortdictionary)
 
+ContainerIndex.types += [ListInset]
+
 class ListOf(ListInset):
   "A list of entities (figures, tables, algorithms)"
 
@@ -160,6 +163,7 @@ class IndexGroup(Container):
     return 'Index group'
 
 IndexGroup.root = IndexGroup().create()
+ConversionContext.register(IndexGroup, 'root', lambda: IndexGroup().create())
 
 class IndexEntry(Container):
   "An entry in the alphabetical index."
@@ -234,6 +238,8 @@ class NomenclatureEntry(Link):
     self.setmutualdestination(entry)
     NomenclatureEntry.entries[key] = entry
 
+ConversionContext.register(NomenclatureEntry, 'entries', dict)
+
 class PrintNomenclature(ListInset):
   "Print all nomenclature entries"
 
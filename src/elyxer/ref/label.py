@@ -29,6 +29,7 @@ from elyxer.gen.container import *
 from elyxer.gen.styles import *
 from elyxer.ref.link import *
 from elyxer.proc.postprocess import *
+from elyxer.util.context import *
 
 
 class Label(Link):
@@ -80,6 +81,9 @@ class Label(Link):
       return 'Unnamed label'
     return 'Label ' + self.key
 
+ConversionContext.register(Label, 'names', dict)
+ConversionContext.registerinitial(Label, 'lastlayout')
+
 class Reference(Link):
   "A reference to a label."
 
@@ -140,3 +144,6 @@ class Reference(Link):
     "Return a printable representation."
     return 'Reference ' + self.key
 
+ConversionContext.register(Reference, 'references', dict)
+ContainerIndex.types += [Reference]
+
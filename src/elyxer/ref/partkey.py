@@ -30,6 +30,7 @@ from elyxer.util.docparams import *
 from elyxer.ref.label import *
 from elyxer.gen.inset import *
 from elyxer.out.template import *
+from elyxer.util.context import *
 
 
 class PartKey(object):
@@ -221,3 +222,5 @@ class PartKeyGenerator(object):
   forlayout = classmethod(forlayout)
   forindex = classmethod(forindex)
 
+ConversionContext.register(PartKeyGenerator, 'partkeyed', list)
+
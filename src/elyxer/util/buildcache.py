@@ -0,0 +1,153 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer build cache: skip documents whose dependencies have not changed.
+
+
+import os
+from elyxer.util.trace import Trace
+from elyxer.util.options import *
+from elyxer.util.context import *
+from elyxer.conf.config import *
+
+
+class Dependencies(object):
+  "The files that the current document depends on:"
+  "included documents and listings, BibTeX files, images, templates..."
+  "Also the files written besides the output: split parts, converted images."
+
+  files = []
+  outputs = []
+
+  def add(cls, filename):
+    "Add a file to the dependencies of the current document."
+    filename = os.path.abspath(filename)
+    if not filename in cls.files:
+      cls.files.append(filename)
+
+  def addoutput(cls, filename):
+    "Add a file written by the conversion of the current document."
+    filename = os.path.abspath(filename)
+    if not filename in cls.outputs:
+      cls.outputs.append(filename)
+
+  add = classmethod(add)
+  addoutput = classmethod(addoutput)
+
+ConversionContext.register(Dependencies, 'files', list)
+ConversionContext.register(Dependencies, 'outputs', list)
+
+class BuildCache(object):
+  "A cache of conversions, to skip documents that have not changed."
+  "For each output file the cache stores the hash of every input file,"
+  "along with a signature of the eLyXer version and the options used,"
+  "and the other files written, which must still exist."
+
+  # options that do not affect the contents of the output
+  ignored = ['location', 'instance', 'branches', 'quiet', 'debug', 'showlines',
+      'batch', 'jobs', 'nul', 'serve', 'buildcache', 'formulacache', 'formulacachesize',
+      'formulajobs', 'imagejobs']
+  blocksize = 65536
+
+  def __init__(self, filein, fileout):
+    "Set the input and output filenames and read the current signature."
+    import hashlib
+    self.filein = filein
+    self.fileout = fileout
+    key = hashlib.sha1(os.path.abspath(fileout).encode('utf-8')).hexdigest()
+    self.filename = os.path.join(Options.buildcache, key + '.json')
+    self.signature = self.getsignature()
+
+  def create(cls, filein, fileout):
+    "Create a build cache if enabled and both input and output are files."
+    if not Options.buildcache:
+      return None
+    if not isinstance(filein, basestring) or not isinstance(fileout, basestring):
+      return None
+    return BuildCache(filein, fileout)
+
+  create = classmethod(create)
+
+  def isuptodate(self):
+    "Find out if the output is up to date with all its dependencies."
+    if not os.path.exists(self.fileout) or not os.path.exists(self.filename):
+      return False
+    import json
+    try:
+      entry = json.load(open(self.filename, 'rb'))
+    except (IOError, ValueError), exception:
+      Trace.error('Invalid build cache ' + self.filename + ': ' + unicode(exception))
+      return False
+    if entry.get('signature') != self.signature:
+      return False
+    for filename, filehash in entry.get('files', []):
+      if self.hashfile(filename) != filehash:
+        return False
+    for filename in entry.get('outputs', []):
+      if not os.path.exists(filename):
+        return False
+    return True
+
+  def store(self):
+    "Store the hashes of the input file and all its dependencies,"
+    "and the names of the files written."
+    import json
+    entry = dict()
+    entry['signature'] = self.signature
+    entry['files'] = []
+    for filename in [os.path.abspath(self.filein)] + Dependencies.files:
+      entry['files'].append([filename, self.hashfile(filename)])
+    entry['outputs'] = Dependencies.outputs
+    if not os.path.isdir(Options.buildcache):
+      os.makedirs(Options.buildcache)
+    temp = self.filename + '.' + unicode(os.getpid())
+    fileout = open(temp, 'wb')
+    json.dump(entry, fileout)
+    fileout.close()
+    os.rename(temp, self.filename)
+
+  def hashfile(self, filename):
+    "Get the hash of the contents of a file, or None if it does not exist."
+    if not os.path.isfile(filename):
+      return None
+    import hashlib
+    digest = hashlib.sha1()
+    filein = open(filename, 'rb')
+    try:
+      block = filein.read(BuildCache.blocksize)
+      while block:
+        digest.update(block)
+        block = filein.read(BuildCache.blocksize)
+    finally:
+      filein.close()
+    return digest.hexdigest()
+
+  def getsignature(self):
+    "Get a signature of the eLyXer version and the options used."
+    import hashlib
+    values = [GeneralConfig.version['number'], GeneralConfig.version['date']]
+    for name in sorted(vars(Options)):
+      value = getattr(Options, name)
+      if not name.startswith('_') and not callable(value) and not name in self.ignored:
+        values.append(name + '=' + repr(value))
+    return hashlib.sha1('\n'.join(values).encode('utf-8')).hexdigest()
+
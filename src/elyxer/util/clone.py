@@ -55,12 +55,14 @@ class ContainerExtractor(object):
     self.allowed = config['allowed']
     self.cloned = config['cloned']
     self.extracted = config['extracted']
+    self.located = set(self.allowed + self.cloned)
+    self.recursive = set(self.extracted)
 
   def extract(self, container):
     "Extract a group of selected containers from elyxer.a container."
     list = []
-    locate = lambda c: c.__class__.__name__ in self.allowed + self.cloned
-    recursive = lambda c: c.__class__.__name__ in self.extracted
+    locate = lambda c: c.__class__.__name__ in self.located
+    recursive = lambda c: c.__class__.__name__ in self.recursive
     process = lambda c: self.process(c, list)
     container.recursivesearch(locate, recursive, process)
     return list
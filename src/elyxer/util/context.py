@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer per-document conversion context.
+
+
+class ConversionContext(object):
+  """The state of the conversion of a single document.
+  Document state is kept in class attributes (Label.names, NumberGenerator.counters...);
+  each module registers those attributes here, along with a function to create
+  their initial value. A context holds one value for each registered attribute:
+  activating a context saves the values of the current one and swaps its own in,
+  so that one process can convert many documents one after another."""
+
+  attributes = []
+  creators = []
+  current = None
+
+  def register(cls, owner, name, create, *aliases):
+    "Register a class attribute and the function to create its initial value."
+    "Aliases are (owner, name) pairs that share the same value."
+    cls.attributes.append([(owner, name)] + list(aliases))
+    cls.creators.append(create)
+
+  def registerinitial(cls, owner, *names):
+    "Register some class attributes with immutable values: keep the current ones."
+    for name in names:
+      cls.register(owner, name, ConstantCreator(getattr(owner, name)))
+
+  register = classmethod(register)
+  registerinitial = classmethod(registerinitial)
+
+  def __init__(self):
+    "Create a context with initial values for all registered attributes."
+    self.reset()
+
+  def reset(self):
+    "Reset all values to their initial state."
+    self.values = [create() for create in ConversionContext.creators]
+    if ConversionContext.current == self:
+      self.write()
+    return self
+
+  def activate(self):
+    "Make this context current, saving the values of the previous one."
+    if ConversionContext.current == self:
+      return self
+    if ConversionContext.current:
+      ConversionContext.current.read()
+    self.write()
+    ConversionContext.current = self
+    return self
+
+  def read(self):
+    "Read the values of all registered attributes into the context."
+    self.values = [getattr(*attributes[0]) for attributes in ConversionContext.attributes]
+
+  def write(self):
+    "Write the values in the context to all registered attributes."
+    for attributes, value in zip(ConversionContext.attributes, self.values):
+      for owner, name in attributes:
+        setattr(owner, name, value)
+
+class ConstantCreator(object):
+  "Creates always the same immutable value."
+
+  def __init__(self, value):
+    self.value = value
+
+  def __call__(self):
+    "Return the value."
+    return self.value
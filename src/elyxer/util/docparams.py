@@ -23,6 +23,7 @@
 # eLyXer: LyX document parameters
 
 from elyxer.util.trace import Trace
+from elyxer.util.context import *
 
 
 class DocumentParameters(object):
@@ -38,3 +39,7 @@ class DocumentParameters(object):
   outputchanges = False
   displaymode = False
 
+ConversionContext.registerinitial(DocumentParameters, 'pdftitle',
+    'indentstandard', 'tocdepth', 'startinglevel', 'maxdepth', 'language',
+    'bibliography', 'outputchanges', 'displaymode')
+
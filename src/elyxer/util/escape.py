@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#   eLyXer -- convert LyX source files to HTML output.
+#
+#   Copyright (C) 2009 Alex Fernández
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# --end--
+# Alex 20261018
+# eLyXer compiled escaping of strings with maps of replacements.
+
+import re
+from elyxer.conf.config import *
+
+
+class Escaper(object):
+  "Escapes strings with a map of replacements, compiled once."
+  "Replacements are done in the order of their sorted keys, each one on the"
+  "result of the previous ones; the sorted list of pieces is computed just once."
+
+  cache = dict()
+  # keep all compiled maps, so that their ids are not reused
+  compiled = []
+
+  def get(cls, replacements):
+    "Get the escaper for a map of replacements, compiling it the first time."
+    escaper = cls.cache.get(id(replacements))
+    if not escaper:
+      escaper = Escaper(replacements)
+      cls.cache[id(replacements)] = escaper
+      cls.compiled.append(replacements)
+    return escaper
+
+  get = classmethod(get)
+
+  def __init__(self, replacements):
+    "Compile the replacements into an ordered list of pieces."
+    self.pieces = []
+    for piece in sorted(replacements.keys()):
+      self.pieces.append((piece, replacements[piece]))
+
+  def escape(self, line):
+    "Escape a line with all replacements."
+    for piece, replacement in self.pieces:
+      if piece in line:
+        line = line.replace(piece, replacement)
+    return line
+
+class EscapeMaps(object):
+  "All maps of replacements in the escape configuration, already compiled."
+
+  chars = Escaper.get(EscapeConfig.chars)
+  commands = Escaper.get(EscapeConfig.commands)
+  entities = Escaper.get(EscapeConfig.entities)
+  html = Escaper.get(EscapeConfig.html)
+  iso885915 = Escaper.get(EscapeConfig.iso885915)
+  nonunicode = Escaper.get(EscapeConfig.nonunicode)
+
+class EntityEscaper(object):
+  "Escapes all characters above 128 to numeric HTML entities, in linear time."
+  "A high surrogate 0xd835 followed by any character is a mathematical"
+  "alphanumeric symbol in a narrow build, and is escaped as a single entity."
+
+  instance = None
+  pattern = re.compile(u'\ud835.|[^\x00-\x80]', re.DOTALL)
+
+  def escape(self, line):
+    "Escape all characters above 128 in a line."
+    return self.pattern.sub(self.replace, line)
+
+  def replace(self, match):
+    "Get the entity for a matched character."
+    found = match.group(0)
+    if len(found) == 2:
+      codepoint = ord(found[1]) + 0xf800
+    else:
+      codepoint = ord(found)
+    return '&#' + hex(codepoint)[1:] + ';'
+
+EntityEscaper.instance = EntityEscaper()
+
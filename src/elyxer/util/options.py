@@ -27,6 +27,7 @@ import sys
 from elyxer.conf.config import *
 from elyxer.util.trace import *
 from elyxer.util.clparse import *
+from elyxer.util.context import *
 
 
 class Options(object):
@@ -84,6 +85,15 @@ class Options(object):
   copyimages = False
   googlecharts = False
   embedcss = []
+  batch = False
+  jobs = None
+  nul = False
+  serve = None
+  buildcache = None
+  formulacache = None
+  formulacachesize = 100
+  formulajobs = None
+  imagejobs = None
 
   branches = dict()
 
@@ -119,6 +129,8 @@ class Options(object):
       except:
         Trace.error('--splitpart needs a numeric argument, not ' + Options.splitpart)
         self.usage()
+    for name in ['jobs', 'formulajobs', 'imagejobs', 'formulacachesize']:
+      self.parsepositive(name)
     if Options.lowmem or Options.toc or Options.tocfor:
       Options.memory = False
     self.parsefootnotes()
@@ -139,7 +151,10 @@ class Options(object):
       Trace.error('Option --nocopy is deprecated; it is no longer needed')
     if Options.jsmath:
       Trace.error('Option --jsmath is deprecated; use --mathjax instead')
-    # set in Trace if necessary
+    self.settrace()
+
+  def settrace(self):
+    "Set the trace modes from the options."
     for param in dir(Trace):
       if param.endswith('mode'):
         setattr(Trace, param, getattr(self, param[:-4]))
@@ -152,6 +167,21 @@ class Options(object):
     Trace.error('Main program of the eLyXer package (http://elyxer.nongnu.org/).')
     self.showoptions()
 
+  def parsepositive(self, name):
+    "Parse a numeric option that must be bigger than zero, if given."
+    value = getattr(Options, name)
+    if not value:
+      return
+    try:
+      number = int(value)
+    except ValueError:
+      Trace.error('--' + name + ' needs a numeric argument, not ' + unicode(value))
+      self.usage()
+    if number <= 0:
+      Trace.error('--' + name + ' requires a number bigger than zero')
+      self.usage()
+    setattr(Options, name, number)
+
   def parsefootnotes(self):
     "Parse footnotes options."
     if not Options.footnotes:
@@ -197,6 +227,7 @@ class Options(object):
     Trace.error('    --imageformat ".ext":   image output format, or "copy" to copy images')
     Trace.error('    --noconvert:            do not convert images, use in original locations')
     Trace.error('    --converter "inkscape": use an alternative program to convert images')
+    Trace.error('    --imagejobs "N":        convert up to N images at the same time')
     Trace.error('  Options for footnote display:')
     Trace.error('    --numberfoot:           mark footnotes with numbers instead of letters')
     Trace.error('    --symbolfoot:           mark footnotes with symbols (*, **...)')
@@ -220,6 +251,16 @@ class Options(object):
     Trace.error('    --googlecharts:         use Google Charts to generate formula images')
     Trace.error('    --template "file":      use a template, put everything in <!--$content-->')
     Trace.error('    --copyright:            add a copyright notice at the bottom')
+    Trace.error('    --buildcache "dir":     skip documents not changed since the last run')
+    Trace.error('    --formulacache "dir":   keep processed formulas in a directory across runs')
+    Trace.error('    --formulacachesize "N": maximum size of the formula cache in MB (default 100)')
+    Trace.error('    --formulajobs "N":      render formulas in advance in N worker processes')
+    Trace.error('  Options for batch conversion:')
+    Trace.error('    --batch:                convert all files in a directory or manifest:')
+    Trace.error('      elyxer.py --batch [options] directory|manifest [destdir]')
+    Trace.error('    --jobs "N":             use N worker processes (default: one per CPU)')
+    Trace.error('    --serve "socket":       serve conversions on a Unix socket, for use with:')
+    Trace.error('      elyxer-client.py socket [options] filein fileout')
     Trace.error('  Deprecated options:')
     Trace.error('    --toc:                  (deprecated) create a table of contents')
     Trace.error('    --toctarget "page":     (deprecated) generate a TOC for the given page')
@@ -249,6 +290,8 @@ class Options(object):
     Trace.message(GeneralConfig.version['lyxformat'])
     sys.exit()
 
+ConversionContext.register(Options, 'branches', dict)
+
 class BranchOptions(object):
   "A set of options for a branch"
 
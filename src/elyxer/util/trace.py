@@ -31,6 +31,7 @@ class Trace(object):
   quietmode = False
   showlinesmode = False
 
+  # a string or an object (like a line reader) to show before messages
   prefix = None
 
   def debug(cls, message):
@@ -44,14 +45,14 @@ class Trace(object):
     if Trace.quietmode:
       return
     if Trace.prefix and Trace.showlinesmode:
-      message = Trace.prefix + message
+      message = unicode(Trace.prefix) + message
     Trace.show(message, sys.stdout)
 
   def error(cls, message):
     "Show an error message"
     message = '* ' + message
     if Trace.prefix and Trace.showlinesmode:
-      message = Trace.prefix + message
+      message = unicode(Trace.prefix) + message
     Trace.show(message, sys.stderr)
 
   def fatal(cls, message):
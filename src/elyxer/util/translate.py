@@ -26,6 +26,7 @@ import gettext
 from elyxer.util.trace import Trace
 from elyxer.util.docparams import *
 from elyxer.conf.config import *
+from elyxer.util.context import *
 
 
 class Translator(object):
@@ -84,3 +85,5 @@ class Translator(object):
 
 Translator.instance = Translator()
 
+ConversionContext.register(Translator, 'instance', Translator)
+
@@ -29,6 +29,7 @@ from elyxer.gen.layout import *
 from elyxer.gen.inset import *
 from elyxer.gen.float import *
 from elyxer.ref.label import *
+from elyxer.util.context import *
 
 
 class NewfangledChunk(Layout):
@@ -106,6 +107,9 @@ class NewfangledChunk(Layout):
     contents.append(Constant(text))
     return TaggedText().complete(contents, 'span class="chunkdecl"', True)
 
+ConversionContext.register(NewfangledChunk, 'names', dict)
+ConversionContext.registerinitial(NewfangledChunk, 'firsttime')
+
 class ChunkProcessor(object):
   "A processor for listings that belong to chunks."
 
@@ -178,6 +182,9 @@ class ChunkProcessor(object):
       return
     ChunkProcessor.counters[ChunkProcessor.lastchunk.name] = listing.counter
 
+ConversionContext.register(ChunkProcessor, 'counters', dict)
+ConversionContext.registerinitial(ChunkProcessor, 'lastchunk')
+
 class NewfangledChunkRef(Inset):
   "A reference to a chunk."
 
@@ -216,3 +223,5 @@ class NewfangledChunkRef(Inset):
     "Return a printable representation."
     return 'Reference to chunk ' + self.ref
 
+ConversionContext.register(NewfangledChunkRef, 'references', dict)
+
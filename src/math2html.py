@@ -31,22 +31,56 @@ from elyxer.maths.hybrid import *
 from elyxer.maths.array import *
 from elyxer.maths.macro import *
 from elyxer.proc.formulaproc import *
+from elyxer.maths.corpus import *
 
 
 def math2html(formula):
   "Convert some TeX math to HTML."
-  factory = FormulaFactory()
-  whole = factory.parseformula(formula)
-  FormulaProcessor().process(whole)
+  whole = FormulaCache.instance.create(formula)
   whole.process()
   return ''.join(whole.gethtml())
 
+def math2htmlbatch(formulas):
+  "Convert many formulas in a pool of processes; see FormulaBatch."
+  "Yield the HTML (None if it failed) and a list of errors for each formula."
+  records = (FormulaRecord(formula, index + 1) for index, formula in enumerate(formulas))
+  for record in FormulaBatch().convert(records):
+    yield record.html, record.errors
+
+def convertbatch(args):
+  "Convert formula records read from a file (or standard input) to another (or output)."
+  if len(args) > 2:
+    Trace.error('Usage: math2html.py --batch [--nul] [--jobs "N"] [filein] [fileout]')
+    exit(1)
+  filein = sys.stdin
+  fileout = sys.stdout
+  if len(args) > 0:
+    filein = open(args[0], 'rb')
+  if len(args) > 1:
+    fileout = open(args[1], 'wb')
+  records = JSONRecords()
+  if Options.nul:
+    records = NULRecords()
+  failed = 0
+  for record in FormulaBatch().convert(records.read(filein)):
+    records.write(fileout, record)
+    if record.html == None:
+      failed += 1
+  fileout.flush()
+  if failed > 0:
+    Trace.error(unicode(failed) + ' formulas failed')
+    exit(1)
+
 def main():
   "Main function, called if invoked from elyxer.the command line"
   args = sys.argv
   Options().parseoptions(args)
+  if Options.batch:
+    convertbatch(args)
+    return
   if len(args) != 1:
     Trace.error('Usage: math2html.py escaped_string')
+    Trace.error('  or: math2html.py --batch [--nul] [--jobs "N"] [filein] [fileout]')
     exit()
   result = math2html(args[0])
   Trace.message(result)
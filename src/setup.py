@@ -40,7 +40,7 @@ setup(name = 'eLyXer',
     author_email = 'elyxer@gmail.com',
     url = 'http://elyxer.nongnu.org/',
     packages = packages,
-    scripts = ['elyxer.py', 'math2html.py', 'loremipsumize.py'],
+    scripts = ['elyxer.py', 'elyxer-client.py', 'math2html.py', 'loremipsumize.py'],
     classifiers = [
       'License :: OSI Approved :: GNU General Public License (GPL)',
       'Development Status :: 5 - Production/Stable', 'Environment :: Console',